@@ -1,10 +1,25 @@
 from bs4 import BeautifulSoup
+import glob
+import os
+import re
+import sys
 import pandas as pd
 
+def page_number(path):
+    # messages.html - первая страница экспорта, messagesN.html - N-я
+    match = re.search(r'messages(\d*)\.html$', os.path.basename(path))
+    return int(match.group(1) or 1) if match else 0
+
 class TelegramChatParser:
     def __init__(self, html_path):
-        self.html_path = html_path
+        # Можно передать один файл, список страниц экспорта или папку экспорта
+        if isinstance(html_path, str) and os.path.isdir(html_path):
+            html_path = glob.glob(os.path.join(html_path, 'messages*.html'))
+        if isinstance(html_path, str):
+            html_path = [html_path]
+        self.html_paths = sorted(html_path, key=page_number)
         self.messages = []
+        self.sender_name = None
     
     def extract_name(self, from_name_tag):
         if from_name_tag:
@@ -14,10 +29,15 @@ class TelegramChatParser:
         return None
     
     def parse(self):
-        with open(self.html_path, 'r', encoding='utf-8') as file:
+        for html_path in self.html_paths:
+            self.parse_page(html_path)
+    
+    def parse_page(self, html_path):
+        with open(html_path, 'r', encoding='utf-8') as file:
             soup = BeautifulSoup(file, 'html.parser')
         
-        sender_name = None
+        # Отправитель переносится с предыдущей страницы: первые сообщения страницы могут быть без from_name
+        sender_name = self.sender_name
         for message in soup.find_all('div', class_='message'):
             sender = message.find('div', class_='from_name')
             text = message.find('div', class_='text')
@@ -36,6 +56,8 @@ class TelegramChatParser:
                         sender_name = extracted_name
                 
                 self.messages.append([sender_name, text_content])
+        
+        self.sender_name = sender_name
     
     def to_csv(self, output_path):
         self.parse()
@@ -44,4 +66,6 @@ class TelegramChatParser:
         df.to_csv(output_path, index=False, encoding='utf-8')
 
 if __name__ == "__main__":
-    TelegramChatParser("messages.html").to_csv("chat_messages.csv")
+    # python HTML_parser.py [messages.html messages2.html ... | папка экспорта]
+    paths = sys.argv[1:] or ["messages.html"]
+    TelegramChatParser(paths[0] if len(paths) == 1 else paths).to_csv("chat_messages.csv")
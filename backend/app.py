@@ -1,34 +1,173 @@
-from fastapi import FastAPI, HTTPException, Request, UploadFile, File, BackgroundTasks, Form
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form
 from pydantic import BaseModel
-from fastapi.responses import StreamingResponse
-from transformers import pipeline, TrainingArguments, Trainer
-from torch.utils.data import Dataset
-import torch
-import threading
+from fastapi.responses import FileResponse, Response, StreamingResponse
 import pandas as pd
-import io
+import itertools
+import json
+import os
+import queue
 import time
-
-from utilities.data_preprocessing import DataPreprocessor
-from utilities.HTML_parser import TelegramChatParser
+import zipfile
+from typing import List
+
+from utilities.analysis_jobs import AnalysisJobQueue
+from utilities.chat_aggregates import aggregate_chat
+from utilities.chat_history import ChatHistoryStore
+from utilities.csv_schema import sniff_csv_format
+from utilities.data_preprocessing import DataPreprocessor, shutdown_process_pool
+from utilities.executors import BlockingExecutor
+from utilities.HTML_parser import TelegramChatParser, parse_export_zip, shutdown_parser_pool
+from utilities.inference import BatchInferenceEngine
+from utilities.inference_backends import make_backend_factory
+from utilities.micro_batching import DynamicBatcher
+from utilities.model_handle import ModelHandle
+from utilities.prediction_cache import PredictionCache
+from utilities.resources import get_resources
+from utilities.token_frequencies import LabelTokenFrequencies
+from utilities.training_jobs import TrainingJobManager
+from utilities.uploads import UploadOffsetError, UploadStore
 
 app = FastAPI()
 
-# Блокировка для потокобезопасности модели
-model_lock = threading.Lock()
+MODEL_NAME = "ozm-gg/ML_Pandas_AI_LearningLab_2025"
+
+# Бэкенд инференса: torch (pipeline) или onnx (ONNX Runtime, опционально с int8-квантизацией)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch")
+ONNX_DIR = os.environ.get("ONNX_DIR", "./onnx_models")
+ONNX_QUANTIZE = os.environ.get("ONNX_QUANTIZE", "0") == "1"
+ONNX_NUM_THREADS = int(os.environ.get("ONNX_NUM_THREADS", 0))
+
+# Размер микробатча для пакетного инференса
+INFERENCE_BATCH_SIZE = int(os.environ.get("INFERENCE_BATCH_SIZE", 32))
+
+# Кэш предсказаний по очищенному тексту и версии модели (PREDICTION_CACHE_SIZE=0 отключает кэш)
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 100000))
+PREDICTION_CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", 0))
+PREDICTION_CACHE_DB = os.environ.get("PREDICTION_CACHE_DB", "")
+
+
+def prediction_cache_namespace():
+    # Предсказания разных бэкендов и int8-квантизации различаются: они не должны делить записи в SQLite
+    backend = INFERENCE_BACKEND
+    if INFERENCE_BACKEND == "onnx" and ONNX_QUANTIZE:
+        backend = "onnx-int8"
+    return f"{MODEL_NAME}|{backend}"
+
+
+# Модель, кэши, хранилища и очереди создаются в обработчиках startup, а не при импорте модуля:
+# процессы, запущенные через spawn (обучение, разбор страниц, предобработка), заново импортируют
+# app.py как __mp_main__ и не должны загружать модель или трогать состояние на диске
+model_handle = None
+prediction_cache = None
+inference_engine = None
+
+
+@app.on_event("startup")
+def load_model():
+    global model_handle, prediction_cache, inference_engine
+    from transformers import pipeline
+
+    sentiment_pipeline = pipeline("text-classification", model=MODEL_NAME)
+    # Инференс читает неизменяемые снимки модели без блокировки, эксклюзивна только замена модели
+    model_handle = ModelHandle(
+        sentiment_pipeline.model,
+        sentiment_pipeline.tokenizer,
+        backend_factory=make_backend_factory(
+            INFERENCE_BACKEND, onnx_dir=ONNX_DIR, quantize=ONNX_QUANTIZE, num_threads=ONNX_NUM_THREADS
+        )
+    )
+    prediction_cache = PredictionCache(
+        max_size=PREDICTION_CACHE_SIZE,
+        ttl=PREDICTION_CACHE_TTL,
+        sqlite_path=PREDICTION_CACHE_DB or None,
+        namespace=prediction_cache_namespace()
+    )
+    inference_engine = BatchInferenceEngine(model_handle, batch_size=INFERENCE_BATCH_SIZE, cache=prediction_cache)
+
 
-sentiment_pipeline = pipeline("text-classification", model="ozm-gg/ML_Pandas_AI_LearningLab_2025")
-  
 def classify(text):
-    def f(x):
-        if x < -0.01:
-            return "Negative"
-        elif x > 0.10:
-            return "Positive"
-        else:
-            return "Neutral"
-    res = sentiment_pipeline(text)
-    return {"label" : f(res[0]['score']), "score" : res[0]['score']}
+    return inference_engine.classify(text)
+
+
+def classify_batch(texts):
+    return inference_engine.classify_batch(texts)
+
+
+# Окно сбора одиночных запросов в один батч и максимальный размер такого батча
+BATCH_WINDOW_MS = float(os.environ.get("BATCH_WINDOW_MS", 5))
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", INFERENCE_BATCH_SIZE))
+
+# Пулы потоков для блокирующей работы: разбор и предобработка загрузок, одиночные тексты и инференс
+# не делят потоки между собой, поэтому большая загрузка не задерживает короткие запросы
+BULK_WORKERS = int(os.environ.get("BULK_WORKERS", 2))
+INTERACTIVE_WORKERS = int(os.environ.get("INTERACTIVE_WORKERS", 4))
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 1))
+
+bulk_executor = BlockingExecutor("bulk", max_workers=BULK_WORKERS)
+interactive_executor = BlockingExecutor("interactive", max_workers=INTERACTIVE_WORKERS)
+inference_executor = BlockingExecutor("inference", max_workers=INFERENCE_WORKERS)
+
+sentiment_batcher = DynamicBatcher(
+    classify_batch,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_WINDOW_MS,
+    executor=inference_executor.executor
+)
+
+
+# Число процессов и размер чанка для параллельной предобработки датасетов
+PREPROCESS_WORKERS = int(os.environ.get("PREPROCESS_WORKERS", 1))
+PREPROCESS_CHUNK_SIZE = int(os.environ.get("PREPROCESS_CHUNK_SIZE", 2000))
+
+
+def make_preprocessor(text_column):
+    return DataPreprocessor(
+        text_column=text_column,
+        workers=PREPROCESS_WORKERS,
+        chunk_size=PREPROCESS_CHUNK_SIZE
+    )
+
+
+# Файл для сохранения прогретого кэша лемм между перезапусками (пусто - не сохранять)
+LEMMA_CACHE_PATH = os.environ.get("LEMMA_CACHE_PATH", "")
+
+
+@app.on_event("startup")
+def warm_up_resources():
+    # Загружаем морфоанализатор, NamesExtractor и стоп-слова до первого запроса
+    resources = get_resources()
+    if LEMMA_CACHE_PATH:
+        resources.lemma_cache.load(LEMMA_CACHE_PATH)
+    resources.warm_up()
+
+
+@app.on_event("shutdown")
+def save_lemma_cache():
+    if LEMMA_CACHE_PATH:
+        get_resources().lemma_cache.save(LEMMA_CACHE_PATH)
+
+
+@app.on_event("shutdown")
+def stop_preprocess_workers():
+    shutdown_process_pool()
+    shutdown_parser_pool()
+
+
+@app.on_event("startup")
+async def start_batcher():
+    sentiment_batcher.start()
+
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    await sentiment_batcher.stop()
+
+
+@app.on_event("shutdown")
+def stop_executors():
+    for executor in (bulk_executor, interactive_executor, inference_executor):
+        executor.shutdown()
+
 
 class TextRequest(BaseModel):
     text: str
@@ -39,175 +178,697 @@ class SentimentResponse(BaseModel):
     score: float
 
 
+class BatchTextRequest(BaseModel):
+    texts: List[str]
+
+
+class BatchSentimentResponse(BaseModel):
+    results: List[SentimentResponse]
+
+
 # ======== Анализ тональности текста ========
 @app.post("/analyze_sentiment/", response_model=SentimentResponse)
 async def analyze_sentiment(request: Request, text_request: TextRequest):
+    try:
+        data_preprocessor = DataPreprocessor(text_column="MessageText")
+        cleaned_text = await interactive_executor.run(data_preprocessor.preprocess_text, text_request.text)
+
+        # Одиночные запросы объединяются в батчи через DynamicBatcher
+        result = await sentiment_batcher.submit(cleaned_text)
+        return {"label": result["label"], "score": result["score"]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Ограничение на число текстов в одном пакетном запросе
+SENTIMENT_BATCH_MAX_TEXTS = int(os.environ.get("SENTIMENT_BATCH_MAX_TEXTS", 1000))
+
+
+def preprocess_texts(texts):
     data_preprocessor = DataPreprocessor(text_column="MessageText")
-    cleaned_text = data_preprocessor.preprocess_text(text_request.text)
+    return [data_preprocessor.preprocess_text(text) for text in texts]
+
+
+@app.post("/analyze_sentiment_batch/", response_model=BatchSentimentResponse)
+async def analyze_sentiment_batch(batch_request: BatchTextRequest):
+    if len(batch_request.texts) > SENTIMENT_BATCH_MAX_TEXTS:
+        raise HTTPException(
+            status_code=413, detail=f"Не больше {SENTIMENT_BATCH_MAX_TEXTS} текстов в одном запросе"
+        )
     try:
-        with model_lock:  # Блокировка для потокобезопасности модели
-            result = classify(cleaned_text)
-            return {"label": result["label"], "score": result["score"]}
+        # Весь список проходит предобработку и инференс за один запрос; результаты идут в порядке texts
+        cleaned_texts = await interactive_executor.run(preprocess_texts, batch_request.texts)
+        results = await inference_executor.run(classify_batch, cleaned_texts)
+        return {"results": [{"label": result["label"], "score": result["score"]} for result in results]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/inference_metrics/")
+async def get_inference_metrics():
+    snapshot = model_handle.acquire()
+    return {
+        **sentiment_batcher.metrics(),
+        "backend": snapshot.backend.name,
+        "model_version": snapshot.version,
+        "prediction_cache": prediction_cache.stats(),
+    }
+
+
+@app.get("/executor_metrics/")
+async def get_executor_metrics():
+    return {
+        executor.name: executor.metrics()
+        for executor in (bulk_executor, interactive_executor, inference_executor)
+    }
+
+
+@app.get("/preprocessing_metrics/")
+async def get_preprocessing_metrics():
+    return {"lemma_cache": get_resources().lemma_cache.stats()}
+
+
+# ======== Загрузка больших файлов по частям ========
+# Части дописываются в файл на диске; прерванную загрузку можно продолжить с подтверждённого смещения
+UPLOADS_DIR = os.environ.get("UPLOADS_DIR", "./uploads")
+UPLOAD_MAX_SIZE = int(os.environ.get("UPLOAD_MAX_SIZE", 0))
+UPLOAD_MAX_CHUNK_SIZE = int(os.environ.get("UPLOAD_MAX_CHUNK_SIZE", 64 * 1024 * 1024))
+UPLOAD_TTL = int(os.environ.get("UPLOAD_TTL", 24 * 3600))
+
+upload_store = None
+
+
+@app.on_event("startup")
+def open_upload_store():
+    global upload_store
+    upload_store = UploadStore(UPLOADS_DIR, max_size=UPLOAD_MAX_SIZE, ttl=UPLOAD_TTL)
+
+
+class UploadCreateRequest(BaseModel):
+    filename: str
+    total_size: int
+
+
+def resolve_source(file, upload_id):
+    # Анализ принимает либо обычный файл формы, либо id завершённой загрузки по частям
+    if upload_id:
+        try:
+            return upload_store.open(upload_id)
+        except KeyError:
+            raise HTTPException(status_code=404, detail=f"Загрузка {upload_id} не найдена")
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    if file is None:
+        raise HTTPException(status_code=400, detail="Нужно передать file или upload_id")
+    return file.file
+
+
+def close_after(iterator, source):
+    # Для потоковых ответов: файл закрывается, когда поток дочитан или клиент отключился
+    try:
+        yield from iterator
+    finally:
+        source.close()
+
+
+@app.post("/uploads/")
+async def create_upload(upload_request: UploadCreateRequest):
+    try:
+        return await bulk_executor.run(upload_store.create, upload_request.filename, upload_request.total_size)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+@app.put("/uploads/{upload_id}")
+async def append_upload(upload_id: str, offset: int, request: Request):
+    content_length = int(request.headers.get("content-length") or 0)
+    if content_length > UPLOAD_MAX_CHUNK_SIZE:
+        raise HTTPException(status_code=413, detail=f"Часть больше {UPLOAD_MAX_CHUNK_SIZE} байт")
+
+    data = await request.body()
+    try:
+        return await bulk_executor.run(upload_store.append, upload_id, offset, data)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Загрузка {upload_id} не найдена")
+    except UploadOffsetError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "offset": e.offset})
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+@app.get("/uploads/{upload_id}")
+async def get_upload_status(upload_id: str):
+    try:
+        return await bulk_executor.run(upload_store.status, upload_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Загрузка {upload_id} не найдена")
+
+
+@app.delete("/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    try:
+        await bulk_executor.run(upload_store.delete, upload_id)
+        return {"upload_id": upload_id, "deleted": True}
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Загрузка {upload_id} не найдена")
+
+
 # ======== Предобработка CSV ========
-@app.post("/preprocess_csv/")
-async def preprocess_csv(file: UploadFile = File(...), text_column: str = Form(...)):
+# Размер чанка (в строках) для потокового чтения CSV
+CSV_CHUNK_SIZE = int(os.environ.get("CSV_CHUNK_SIZE", 5000))
+
+
+def iter_cleaned_csv(chunks, data_preprocessor):
+    # Каждый чанк предобрабатывается и сразу отдаётся клиенту, заголовок пишется один раз
     try:
-        contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
+        header = True
+        for chunk in chunks:
+            cleaned_chunk = data_preprocessor.preprocess_dataset(chunk)
+            yield cleaned_chunk.to_csv(index=False, header=header).encode("utf-8")
+            header = False
+    except Exception as e:
+        print("Ошибка потоковой предобработки CSV:", str(e))
+        raise
+
+
+def resolve_csv_format(source, delimiter=None, encoding=None):
+    # Разделитель и кодировку можно передать явно; иначе они определяются по началу файла
+    if delimiter and encoding:
+        return delimiter, encoding
+    sniffed_delimiter, sniffed_encoding = sniff_csv_format(source)
+    return delimiter or sniffed_delimiter, encoding or sniffed_encoding
+
+
+def open_csv_chunks(source, text_column, delimiter=None, encoding=None):
+    delimiter, encoding = resolve_csv_format(source, delimiter, encoding)
+    reader = pd.read_csv(source, chunksize=CSV_CHUNK_SIZE, sep=delimiter, encoding=encoding)
+    first_chunk = next(reader, None)
+    if first_chunk is None:
+        raise ValueError("CSV file is empty")
+    if text_column not in first_chunk.columns:
+        raise ValueError(
+            f"Column '{text_column}' not found in CSV. Available columns: {first_chunk.columns.tolist()}"
+        )
+    return itertools.chain([first_chunk], reader)
 
-        data_preprocessor = DataPreprocessor(text_column=text_column)
-        cleaned_df = data_preprocessor.preprocess_dataset(df.copy())
 
-        output_stream = io.StringIO()
-        cleaned_df.to_csv(output_stream, index=False)
-        cleaned_csv_string = output_stream.getvalue()
+@app.post("/preprocess_csv/")
+async def preprocess_csv(
+    file: UploadFile = File(None),
+    text_column: str = Form(...),
+    upload_id: str = Form(None),
+    delimiter: str = Form(None),
+    encoding: str = Form(None)
+):
+    source = resolve_source(file, upload_id)
+    try:
+        chunks = await bulk_executor.run(open_csv_chunks, source, text_column, delimiter, encoding)
+        data_preprocessor = make_preprocessor(text_column)
 
         return StreamingResponse(
-            io.StringIO(cleaned_csv_string),
+            bulk_executor.iterate(close_after(iter_cleaned_csv(chunks, data_preprocessor), source)),
             media_type="text/csv",
             headers={"Content-Disposition": "attachment;filename=cleaned_data.csv"}
         )
     except Exception as e:
+        source.close()
         raise HTTPException(status_code=500, detail=f"Error processing file: {e}")
 
 
-# ======== Тренировка модели с обновлением прогресса ========
-def train_model(data):
-    try:
-        model = sentiment_pipeline.model
-        tokenizer = sentiment_pipeline.tokenizer
-
-        data["score"] = data["Class"].map({'N': 0, "G": 1, "B": -1})
-        
-        class SentimentDataset(Dataset):
-            def __init__(self, texts, labels, tokenizer, max_length=512):
-                self.texts = texts
-                self.labels = labels
-                self.tokenizer = tokenizer
-                self.max_length = max_length
-
-            def __len__(self):
-                return len(self.texts)
-
-            def __getitem__(self, idx):
-                text = self.texts[idx]
-                label = self.labels[idx]
-                encoding = self.tokenizer(
-                    text,
-                    padding="max_length",
-                    truncation=True,
-                    max_length=self.max_length,
-                    return_tensors="pt"
-                )
-                return {
-                    "input_ids": encoding["input_ids"].squeeze(),
-                    "attention_mask": encoding["attention_mask"].squeeze(),
-                    "labels": torch.tensor(label, dtype=torch.float32)
-                }
-                
-        train_dataset = SentimentDataset(
-            texts=data["MessageText"].tolist(),
-            labels=data["score"].tolist(),
-            tokenizer=tokenizer
-        )
+# ======== Обучение модели в отдельном процессе ========
+# Потоки torch и приоритет процесса обучения: обучение не должно замедлять инференс
+TRAIN_NUM_THREADS = int(os.environ.get("TRAIN_NUM_THREADS", max((os.cpu_count() or 2) // 2, 1)))
+TRAIN_NICENESS = int(os.environ.get("TRAIN_NICENESS", 10))
+TRAINING_JOBS_DIR = os.environ.get("TRAINING_JOBS_DIR", "./training_jobs")
+# Динамический паддинг по батчу, группировка по длине и кэш токенизированных датасетов
+TRAIN_DYNAMIC_PADDING = os.environ.get("TRAIN_DYNAMIC_PADDING", "1") == "1"
+TRAIN_GROUP_BY_LENGTH = os.environ.get("TRAIN_GROUP_BY_LENGTH", "1") == "1"
+TRAINING_CACHE_DIR = os.environ.get("TRAINING_CACHE_DIR", "./training_cache")
+# Ограничения кэша токенизированных датасетов: общий размер в байтах и возраст в секундах (0 - без ограничения)
+TRAINING_CACHE_MAX_SIZE = int(os.environ.get("TRAINING_CACHE_MAX_SIZE", 2 * 1024 ** 3))
+TRAINING_CACHE_MAX_AGE = int(os.environ.get("TRAINING_CACHE_MAX_AGE", 7 * 24 * 3600))
+
+training_manager = None
+
+
+@app.on_event("startup")
+def create_training_manager():
+    global training_manager
+    # Регистрируется после load_model: менеджеру нужен уже созданный model_handle
+    training_manager = TrainingJobManager(
+        model_handle,
+        work_dir=TRAINING_JOBS_DIR,
+        output_dir="./training_results",
+        num_threads=TRAIN_NUM_THREADS,
+        niceness=TRAIN_NICENESS,
+        dynamic_padding=TRAIN_DYNAMIC_PADDING,
+        group_by_length=TRAIN_GROUP_BY_LENGTH,
+        cache_dir=TRAINING_CACHE_DIR,
+        cache_max_size=TRAINING_CACHE_MAX_SIZE,
+        cache_max_age=TRAINING_CACHE_MAX_AGE,
+        # После замены модели старые предсказания недействительны
+        on_model_swapped=lambda version: prediction_cache.clear()
+    )
 
-        training_args = TrainingArguments(
-            output_dir="./training_results",
-            learning_rate=3e-6,  
-            num_train_epochs=3,
-            per_device_train_batch_size=3,
-        )
 
-        trainer = Trainer(
-            model=model,
-            args=training_args,
-            train_dataset=train_dataset,
-        )
+# ======== Эндпоинты для обучения и статуса ========
+@app.post("/train/")
+async def training(file: UploadFile = File(None), upload_id: str = Form(None)):
+    source = resolve_source(file, upload_id)
+    try:
+        with source:
+            df = await bulk_executor.run(pd.read_csv, source, encoding="utf-8")
+        job_id = await bulk_executor.run(training_manager.submit, df)
 
-        trainer.train()
+        return {"message": "Обучение началось!", "job_id": job_id}
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        with model_lock:
-            sentiment_pipeline.model = model
 
-    except Exception as e:
-        raise RuntimeError(f"Ошибка обучения: {str(e)}")
+@app.get("/train_status/")
+async def get_training_status():
+    return training_manager.latest_status()
 
 
-# ======== Эндпоинты для обучения и статуса ========
-@app.post("/train/")
-async def training(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
-    global training_progress
+@app.get("/train_status/{job_id}")
+async def get_training_job_status(job_id: str):
     try:
-        contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
+        return training_manager.status(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Задание обучения {job_id} не найдено")
 
-        training_progress = {"progress": 0, "status": "starting"}
-        background_tasks.add_task(train_model, df)
 
-        return {"message": "Обучение началось!"}
+@app.post("/train_cancel/{job_id}")
+async def cancel_training_job(job_id: str):
+    try:
+        training_manager.cancel(job_id)
+        return training_manager.status(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Задание обучения {job_id} не найдено")
+
+
+# ======== Потоковая выдача результатов анализа (NDJSON) ========
+# Сколько строк классифицируется и отправляется клиенту за одну порцию
+STREAM_BATCH_ROWS = int(os.environ.get("STREAM_BATCH_ROWS", 256))
+# Частоты токенов для облаков слов: top-K на метку и число хранимых счётчиков
+WORD_FREQUENCIES_TOP_K = int(os.environ.get("WORD_FREQUENCIES_TOP_K", 200))
+WORD_FREQUENCIES_CAPACITY = int(os.environ.get("WORD_FREQUENCIES_CAPACITY", 2000))
+
+
+def ndjson_line(message):
+    return (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def rows_line(batch, rows_done, rows_total):
+    # to_json корректно превращает NaN в null, в отличие от json.dumps
+    rows = batch.to_json(orient="records", force_ascii=False, date_format="iso")
+    return (
+        f'{{"type": "rows", "rows_done": {rows_done}, "rows_total": {rows_total}, "rows": {rows}}}\n'
+    ).encode("utf-8")
+
+
+def make_word_frequencies(state=None):
+    frequencies = LabelTokenFrequencies(top_k=WORD_FREQUENCIES_TOP_K, capacity=WORD_FREQUENCIES_CAPACITY)
+    if state is not None:
+        # Подсчёт продолжается с сохранённых счётчиков, поэтому итог покрывает весь чат
+        frequencies.restore(state)
+    return frequencies
+
+
+def iter_labeled_batches(df, cleaned_df, text_column, with_clean_message=False, frequencies=None):
+    # Строки, отброшенные при предобработке, в результат не попадают
+    df = df.loc[cleaned_df.index]
+    texts = cleaned_df[text_column].tolist()
+
+    for start in range(0, len(texts), STREAM_BATCH_ROWS):
+        batch_texts = texts[start:start + STREAM_BATCH_ROWS]
+        # Проход модели идёт через пул inference, как и у интерактивных запросов
+        predictions = inference_executor.run_sync(classify_batch, batch_texts)
+
+        batch = df.iloc[start:start + len(batch_texts)].copy()
+        batch["label"] = [pred.get("label") for pred in predictions]
+        batch["score"] = [pred.get("score") for pred in predictions]
+        if with_clean_message:
+            batch["clean_message"] = batch_texts
+        if frequencies is not None:
+            # Частоты считаются по ходу инференса, повторно тексты не разбираются
+            frequencies.update(batch["label"], batch_texts)
+        yield batch
+
+
+def iter_labeled_rows(
+    df, cleaned_df, text_column, with_clean_message=False, previous=None, frequencies=None, on_complete=None
+):
+    try:
+        if frequencies is None:
+            frequencies = make_word_frequencies()
+        batches = iter_labeled_batches(df, cleaned_df, text_column, with_clean_message, frequencies)
+        rows_total = len(cleaned_df)
+        if previous is not None:
+            # Уже размеченные ранее строки отправляются первыми, без повторного инференса
+            batches = itertools.chain(
+                (previous.iloc[start:start + STREAM_BATCH_ROWS] for start in range(0, len(previous), STREAM_BATCH_ROWS)),
+                batches
+            )
+            rows_total += len(previous)
+
+        rows_done = 0
+        labeled = []
+        for batch in batches:
+            rows_done += len(batch)
+            if on_complete is not None:
+                labeled.append(batch)
+            yield rows_line(batch, rows_done, rows_total)
+
+        if on_complete is not None and labeled:
+            on_complete(pd.concat(labeled), frequencies)
+        yield ndjson_line({"type": "summary", "word_frequencies": frequencies.to_dict()})
+        yield ndjson_line({"type": "done", "rows_total": rows_total})
     except Exception as e:
-        training_progress["status"] = "failed"
-        raise HTTPException(status_code=500, detail=str(e))
+        # Заголовки уже отправлены, поэтому об ошибке сообщаем последней строкой потока
+        print("Ошибка:", str(e))
+        yield ndjson_line({"type": "error", "detail": str(e)})
 
 
-@app.get("/train_status/")
-async def get_training_status():
-    return training_progress
+def ndjson_response(rows):
+    # Шаги генератора (инференс порций) выполняются в пуле bulk, а не в цикле событий
+    return StreamingResponse(bulk_executor.iterate(rows), media_type="application/x-ndjson")
+
+
+# Потоковый разбор экспорта Telegram через lxml (CHAT_PARSER_STREAMING=0 - прежний BeautifulSoup)
+CHAT_PARSER_STREAMING = os.environ.get("CHAT_PARSER_STREAMING", "1") == "1"
+# Число процессов для разбора страниц экспорта из zip-архива (messages.html, messages2.html, ...)
+CHAT_PARSER_WORKERS = int(os.environ.get("CHAT_PARSER_WORKERS", max(1, min(4, (os.cpu_count() or 1) - 1))))
+# Меньшие экспорты разбираются в одном процессе
+CHAT_PARSER_PARALLEL_MIN_SIZE = int(os.environ.get("CHAT_PARSER_PARALLEL_MIN_SIZE", 16 * 1024 * 1024))
+
+
+def parse_chat(source):
+    is_zip = zipfile.is_zipfile(source)
+    source.seek(0)
+    if is_zip:
+        return parse_export_zip(
+            source, workers=CHAT_PARSER_WORKERS, min_parallel_bytes=CHAT_PARSER_PARALLEL_MIN_SIZE
+        )
+    if CHAT_PARSER_STREAMING:
+        return TelegramChatParser(source, is_file=False, streaming=True).to_dataframe()
+    return TelegramChatParser(source.read().decode("utf-8"), is_file=False).to_dataframe()
+
+
+def load_chat(source, last_message_id=None):
+    df = parse_chat(source)
+    if last_message_id is not None:
+        # Инкрементальный режим: предобработка и инференс только для сообщений новее сохранённых
+        df = df[df["MessageId"].gt(last_message_id).fillna(False)]
+
+    data_preprocessor = make_preprocessor("Message")
+    cleaned_df = data_preprocessor.preprocess_dataset(df.copy())
+    return df, cleaned_df
+
+
+def load_csv(source, text_column, delimiter=None, encoding=None):
+    delimiter, encoding = resolve_csv_format(source, delimiter, encoding)
+    df = pd.read_csv(source, sep=delimiter, encoding=encoding)
+
+    data_preprocessor = make_preprocessor(text_column)
+    cleaned_df = data_preprocessor.preprocess_dataset(df.copy())
+    return df, cleaned_df
 
 
 # ======== Анализ чатов (Telegram) ========
-@app.post("/chat_analysis/")
-async def chat_analysis(file: UploadFile = File(...)):
-    try:
-        contents = await file.read()
-        result = contents.decode("utf-8")
-        html_content = str(result)
+# Результаты прошлых анализов для инкрементального режима (поле chat_id)
+CHAT_HISTORY_DIR = os.environ.get("CHAT_HISTORY_DIR", "./chat_history")
+chat_history = None
+
 
-        parser = TelegramChatParser(html_content, is_file=False)
-        df = parser.to_dataframe()
+@app.on_event("startup")
+def open_chat_history():
+    global chat_history
+    chat_history = ChatHistoryStore(CHAT_HISTORY_DIR)
 
-        data_preprocessor = DataPreprocessor(text_column="Message")
-        cleaned_df = data_preprocessor.preprocess_dataset(df.copy())
 
-        with model_lock:
-            predictions = list(cleaned_df["Message"].map(classify))
+def load_chat_history(chat_id):
+    # Сохранённые строки и частоты токенов чата. Без идентификаторов сообщений объединить результаты
+    # нельзя, а без сохранённых частот облака слов покрыли бы только новые сообщения:
+    # в обоих случаях чат анализируется заново
+    previous = chat_history.load(chat_id)
+    state = chat_history.load_frequencies(chat_id)
+    if ChatHistoryStore.last_message_id(previous) is None or state is None:
+        return None, None
+    return previous, state
 
-        df["label"] = [pred.get("label") for pred in predictions]
-        df["score"] = [pred.get("score") for pred in predictions]
 
-        return df.to_dict(orient="records")
+def save_chat_history(chat_id, merged, frequencies):
+    chat_history.save(chat_id, merged, frequencies.state())
+
+
+@app.post("/chat_analysis/")
+async def chat_analysis(file: UploadFile = File(None), chat_id: str = Form(None), upload_id: str = Form(None)):
+    source = resolve_source(file, upload_id)
+    try:
+        if not chat_id:
+            with source:
+                df, cleaned_df = await bulk_executor.run(load_chat, source)
+            return ndjson_response(iter_labeled_rows(df, cleaned_df, "Message"))
+
+        with source:
+            previous, state = await bulk_executor.run(load_chat_history, chat_id)
+            last_message_id = ChatHistoryStore.last_message_id(previous)
+            df, cleaned_df = await bulk_executor.run(load_chat, source, last_message_id)
+        return ndjson_response(iter_labeled_rows(
+            df, cleaned_df, "Message",
+            previous=previous,
+            frequencies=make_word_frequencies(state),
+            on_complete=lambda merged, frequencies: save_chat_history(chat_id, merged, frequencies)
+        ))
     except Exception as e:
         print("Ошибка:", str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.delete("/chat_history/{chat_id}")
+async def delete_chat_history(chat_id: str):
+    if not await bulk_executor.run(chat_history.delete, chat_id):
+        raise HTTPException(status_code=404, detail="История чата не найдена")
+    return {"chat_id": chat_id, "deleted": True}
+
+
 # ======== Анализ CSV ========
 @app.post("/csv_analysis/")
-async def csv_analysis(file: UploadFile = File(...), text_column: str = Form(...)):
+async def csv_analysis(
+    file: UploadFile = File(None),
+    text_column: str = Form(...),
+    upload_id: str = Form(None),
+    delimiter: str = Form(None),
+    encoding: str = Form(None)
+):
+    source = resolve_source(file, upload_id)
     try:
-        contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
-
-        data_preprocessor = DataPreprocessor(text_column=text_column)
-        cleaned_df = data_preprocessor.preprocess_dataset(df.copy())
-
-        with model_lock:
-            predictions = list(cleaned_df[text_column].map(classify))
+        with source:
+            df, cleaned_df = await bulk_executor.run(load_csv, source, text_column, delimiter, encoding)
 
-        df["label"] = [pred.get("label") for pred in predictions]
-        df["score"] = [pred.get("score") for pred in predictions]
-        df["clean_message"] = cleaned_df[text_column]
-
-        return df.to_dict(orient="records")
+        return ndjson_response(iter_labeled_rows(df, cleaned_df, text_column, with_clean_message=True))
     except Exception as e:
         print("Ошибка:", str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ======== Фоновые задания анализа ========
+# Большие файлы обрабатываются в очереди: клиент получает job_id и опрашивает статус
+ANALYSIS_JOBS_DIR = os.environ.get("ANALYSIS_JOBS_DIR", "./analysis_jobs")
+ANALYSIS_JOB_WORKERS = int(os.environ.get("ANALYSIS_JOB_WORKERS", 1))
+ANALYSIS_JOB_QUEUE_SIZE = int(os.environ.get("ANALYSIS_JOB_QUEUE_SIZE", 16))
+# Наибольшая страница строк результата, отдаваемая за один запрос
+JOB_ROWS_MAX_LIMIT = int(os.environ.get("JOB_ROWS_MAX_LIMIT", 1000))
+
+
+def run_analysis_job(params, progress):
+    previous = state = None
+    with upload_store.open(params["upload_id"]) as source:
+        if params["kind"] == "chat":
+            text_column = "Message"
+            if params.get("chat_id"):
+                previous, state = load_chat_history(params["chat_id"])
+            df, cleaned_df = load_chat(source, ChatHistoryStore.last_message_id(previous))
+        else:
+            text_column = params["text_column"]
+            df, cleaned_df = load_csv(source, text_column, params.get("delimiter"), params.get("encoding"))
+
+    rows_total = len(cleaned_df)
+    rows_done = 0
+    # Ранее размеченные строки чата входят в результат без повторного инференса
+    batches = [] if previous is None else [previous]
+    frequencies = make_word_frequencies(state)
+    for batch in iter_labeled_batches(
+        df, cleaned_df, text_column, with_clean_message=params["kind"] == "csv", frequencies=frequencies
+    ):
+        rows_done += len(batch)
+        batches.append(batch)
+        if progress(rows_done, rows_total):
+            return None
+
+    if batches:
+        result = pd.concat(batches)
+    else:
+        result = df.iloc[:0].assign(label=None, score=None)
+
+    summary = {"word_frequencies": frequencies.to_dict()}
+    if params["kind"] == "chat":
+        if params.get("chat_id") and batches:
+            save_chat_history(params["chat_id"], result, frequencies)
+        # Ряды по отправителям, дням и часам: клиент строит графики по ним, не загружая все сообщения
+        summary["aggregates"] = aggregate_chat(result)
+    return result, summary
+
+
+def iter_parquet_csv(path):
+    import pyarrow.parquet as pq
+
+    # Результат читается из Parquet порциями, а не целиком
+    header = True
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=CSV_CHUNK_SIZE):
+        yield batch.to_pandas().to_csv(index=False, header=header).encode("utf-8")
+        header = False
+
+
+analysis_jobs = None
+
+
+@app.on_event("startup")
+def start_analysis_jobs():
+    global analysis_jobs
+    # load_jobs помечает незавершённые задания прерванными, поэтому очередь создаётся только в процессе сервера
+    analysis_jobs = AnalysisJobQueue(
+        run_analysis_job,
+        results_dir=ANALYSIS_JOBS_DIR,
+        workers=ANALYSIS_JOB_WORKERS,
+        max_queued=ANALYSIS_JOB_QUEUE_SIZE
+    )
+    analysis_jobs.start()
+
+
+@app.on_event("shutdown")
+def stop_analysis_jobs():
+    analysis_jobs.stop()
+
+
+@app.post("/jobs/")
+async def submit_analysis_job(
+    kind: str = Form(...),
+    text_column: str = Form(None),
+    upload_id: str = Form(None),
+    file: UploadFile = File(None),
+    delimiter: str = Form(None),
+    encoding: str = Form(None),
+    chat_id: str = Form(None)
+):
+    if kind not in ("csv", "chat"):
+        raise HTTPException(status_code=400, detail="kind должен быть 'csv' или 'chat'")
+    if kind == "csv" and not text_column:
+        raise HTTPException(status_code=400, detail="Для CSV нужно указать text_column")
+
+    try:
+        if upload_id:
+            upload = await bulk_executor.run(upload_store.status, upload_id)
+            if not upload["complete"]:
+                raise HTTPException(status_code=409, detail=f"Загрузка {upload_id} не завершена")
+        elif file is not None:
+            upload = await bulk_executor.run(upload_store.create_from_file, file.filename, file.file)
+        else:
+            raise HTTPException(status_code=400, detail="Нужно передать file или upload_id")
+
+        params = {
+            "kind": kind,
+            "text_column": text_column,
+            "upload_id": upload["upload_id"],
+            "delimiter": delimiter,
+            "encoding": encoding,
+            "chat_id": chat_id if kind == "chat" else None,
+        }
+        # Приоритет - размер файла: маленькие задания не ждут за большими
+        job_id = analysis_jobs.submit(params, upload["total_size"])
+        return analysis_jobs.status(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Загрузка {upload_id} не найдена")
+    except queue.Full:
+        raise HTTPException(status_code=429, detail="Очередь заданий заполнена, повторите позже")
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+@app.get("/jobs/")
+async def list_analysis_jobs():
+    return {"jobs": analysis_jobs.list_jobs(), "metrics": analysis_jobs.metrics()}
+
+
+@app.get("/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    try:
+        return analysis_jobs.status(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Задание {job_id} не найдено")
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_analysis_job_result(job_id: str, format: str = "parquet"):
+    try:
+        path = analysis_jobs.result(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Задание {job_id} не найдено")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "parquet":
+        return FileResponse(path, media_type="application/vnd.apache.parquet", filename=f"{job_id}.parquet")
+    if format == "csv":
+        return StreamingResponse(
+            bulk_executor.iterate(iter_parquet_csv(path)),
+            media_type="text/csv",
+            headers={"Content-Disposition": f"attachment;filename={job_id}.csv"}
+        )
+    raise HTTPException(status_code=400, detail="format должен быть 'parquet' или 'csv'")
+
+
+@app.get("/jobs/{job_id}/rows")
+async def get_analysis_job_rows(job_id: str, offset: int = 0, limit: int = 100):
+    if offset < 0 or not 0 < limit <= JOB_ROWS_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"offset >= 0, 0 < limit <= {JOB_ROWS_MAX_LIMIT}")
+    try:
+        # Строки читаются по требованию: только группы Parquet, в которые попадает страница
+        page, rows_total = await bulk_executor.run(analysis_jobs.rows, job_id, offset, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Задание {job_id} не найдено")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    rows = page.to_json(orient="records", force_ascii=False, date_format="iso")
+    return Response(
+        content=f'{{"offset": {offset}, "limit": {limit}, "rows_total": {rows_total}, "rows": {rows}}}',
+        media_type="application/json"
+    )
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_analysis_job(job_id: str):
+    try:
+        return analysis_jobs.cancel(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Задание {job_id} не найдено")
+
+
+@app.delete("/jobs/{job_id}")
+async def delete_analysis_job(job_id: str):
+    try:
+        await bulk_executor.run(analysis_jobs.delete, job_id)
+        return {"job_id": job_id, "deleted": True}
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Задание {job_id} не найдено")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
 if __name__ == "__main__":
     import uvicorn
 
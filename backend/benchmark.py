@@ -0,0 +1,461 @@
+import argparse
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import urllib.request
+import zipfile
+import pandas as pd
+
+from utilities.data_preprocessing import DataPreprocessor, shutdown_process_pool
+
+
+SAMPLE_TEXTS = [
+    "Я в восторге от этой поездки! Всё было просто замечательно, и погода порадовала солнечными днями.",
+    "Этот фильм оставил невероятное впечатление! Отличная игра актёров и потрясающий сюжет.",
+    "Я очень доволен покупкой! Товар полностью соответствует описанию, качество на высоте.",
+    "Как же приятно, когда тебя окружают такие добрые и заботливые люди!",
+    "Этот ресторан превзошёл все мои ожидания! Вкусная еда, уютная атмосфера и отличное обслуживание.",
+    "Вчера весь день шёл дождь, но к вечеру стало немного теплее.",
+    "Я заказал новый телефон, он пришёл в срок. Пока изучаю его функции.",
+    "Этот фильм был обычным. Ничего особенного, но и не сказать, что он плох.",
+    "Магазин работает до 22:00, так что успел купить всё необходимое.",
+    "Сегодня среда, и я просто занимаюсь своими обычными делами.",
+    "Этот день был ужасным. Всё пошло не так с самого утра, и настроение испортилось окончательно.",
+    "Я разочарован качеством этого товара. Он сломался буквально через два дня после покупки.",
+    "Фильм оказался очень скучным, я еле досмотрел его до конца.",
+    "Обслуживание в этом кафе оставляет желать лучшего. Пришлось ждать заказ больше часа!",
+    "Мне так грустно… Ожидания не оправдались, и я чувствую полное разочарование.",
+    "Анна Сергеевна написала: встречаемся в 10 у входа, ссылка https://example.com/meet",
+]
+
+# Оценки для SAMPLE_TEXTS: 5 позитивных, 5 нейтральных, 5 негативных и нейтральный пример с именем
+SAMPLE_SCORES = [1] * 5 + [0] * 5 + [-1] * 5 + [0]
+
+
+def sample_texts(rows):
+    return [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] for i in range(rows)]
+
+
+def report(name, seconds, rows):
+    print(f"{name:<40} {seconds:8.3f} s  {seconds / rows * 1000:8.3f} ms/row")
+
+
+# ======== Общие ресурсы предобработки ========
+# Строк в одном запросе: до общего реестра каждый запрос создавал свой DataPreprocessor
+REQUEST_ROWS = 50
+
+
+def legacy_preprocess_request(texts):
+    # Поведение до общего реестра: морфоанализатор и NamesExtractor создаются заново на каждый запрос,
+    # набор стоп-слов - на каждую строку
+    from pymorphy3 import MorphAnalyzer
+    from natasha import NamesExtractor, MorphVocab
+    from nltk.corpus import stopwords
+    from nltk.tokenize import word_tokenize
+    from utilities.resources import KEEP_WORDS
+
+    morph = MorphAnalyzer(lang='ru')
+    extractor = NamesExtractor(MorphVocab())
+    results = []
+    for text in texts:
+        spans = [(m.start, m.stop) for m in extractor(text) if m.fact.first or m.fact.middle]
+        parts, last_end = [], 0
+        for start, end in sorted(spans):
+            parts.append(text[last_end:start])
+            last_end = end
+        parts.append(text[last_end:])
+        text = re.sub(r'\b\d+\b', '', ''.join(parts))
+        text = re.sub(r'<[^>]*>', ' ', text, flags=re.MULTILINE)
+        text = re.sub(r'https?://\S+|www\.\S+', ' ', text)
+        text = re.sub(r'[^а-яА-ЯёЁ\s-]', ' ', text, flags=re.IGNORECASE)
+        text = re.sub(r'[\s-]+', ' ', text).strip().lower()
+        final_stopwords = set(stopwords.words('russian')) - KEEP_WORDS
+        words = [w for w in word_tokenize(text, language='russian') if w.lower() not in final_stopwords]
+        results.append(' '.join(morph.parse(w)[0].normal_form for w in words))
+    return results
+
+
+def benchmark_resources(rows):
+    texts = sample_texts(rows)
+    requests = [texts[start:start + REQUEST_ROWS] for start in range(0, rows, REQUEST_ROWS)]
+
+    start = time.perf_counter()
+    for request_texts in requests:
+        legacy_preprocess_request(request_texts)
+    report(f"per-request resources ({REQUEST_ROWS} rows/req)", time.perf_counter() - start, rows)
+
+    from utilities.resources import get_resources
+    start = time.perf_counter()
+    get_resources().warm_up()
+    print(f"{'shared resources warm-up':<40} {time.perf_counter() - start:8.3f} s")
+
+    start = time.perf_counter()
+    for request_texts in requests:
+        preprocessor = DataPreprocessor(text_column="MessageText")
+        for text in request_texts:
+            preprocessor.preprocess_text(preprocessor.remove_names_natasha(text))
+    report(f"shared resources ({REQUEST_ROWS} rows/req)", time.perf_counter() - start, rows)
+
+
+# ======== Слитный конвейер предобработки ========
+GOLDEN_TEXTS = SAMPLE_TEXTS + [
+    "",
+    "   ",
+    "12345 678",
+    "абв123где и 42 кота",
+    "Кто-то где-то — как-нибудь...",
+    "<b>Жирный</b> текст <a href='x'>ссылка</a>",
+    "Смотри www.example.com и https://t.me/chat?x=1 тоже",
+    "Ёлка, ЁЖИК и ещё   много\n\tпробелов",
+    "Latin words only here",
+    "Не очень хорошо, но и не ужасно",
+    "Пётр Ильич Чайковский написал «Щелкунчика» в 1892 году",
+]
+
+
+def staged_preprocess_row(preprocessor, text):
+    # Поэтапный конвейер в том виде, в котором он работал до слияния
+    text = preprocessor.remove_names_natasha(text)
+    text = re.sub(r'\b\d+\b', '', text)
+    text = preprocessor.clean_text(text)
+    text = preprocessor.remove_stopwords(text)
+    return preprocessor.lemmatize_text(text)
+
+
+def benchmark_fused(rows):
+    preprocessor = DataPreprocessor(text_column="MessageText")
+
+    # Эталонная проверка: слитный конвейер обязан давать тот же результат, что и поэтапный
+    for text in GOLDEN_TEXTS:
+        expected = staged_preprocess_row(preprocessor, text)
+        actual = preprocessor.preprocess_document(text)
+        assert actual == expected, f"fused output differs for {text!r}: {actual!r} != {expected!r}"
+    print(f"fused output matches staged output on {len(GOLDEN_TEXTS)} golden texts")
+
+    texts = sample_texts(rows)
+    start = time.perf_counter()
+    for text in texts:
+        staged_preprocess_row(preprocessor, text)
+    report("staged pipeline", time.perf_counter() - start, rows)
+
+    start = time.perf_counter()
+    for text in texts:
+        preprocessor.preprocess_document(text)
+    report("fused pipeline", time.perf_counter() - start, rows)
+
+
+# ======== Параллельная предобработка датасета ========
+def benchmark_parallel(rows):
+    df = pd.DataFrame({"MessageText": sample_texts(rows)})
+    workers = os.cpu_count() or 1
+
+    start = time.perf_counter()
+    serial = DataPreprocessor(text_column="MessageText").preprocess_dataset(df.copy())
+    report("serial preprocess_dataset", time.perf_counter() - start, rows)
+
+    preprocessor = DataPreprocessor(text_column="MessageText", workers=workers, chunk_size=max(rows // (workers * 4), 1))
+    # Первый вызов поднимает пул и прогревает ресурсы в рабочих процессах
+    preprocessor.preprocess_dataset(df.head(preprocessor.chunk_size * workers).copy())
+    start = time.perf_counter()
+    parallel = preprocessor.preprocess_dataset(df.copy())
+    report(f"parallel preprocess_dataset ({workers} workers)", time.perf_counter() - start, rows)
+    shutdown_process_pool()
+
+    pd.testing.assert_frame_equal(serial, parallel)
+    print("parallel output is identical to serial")
+
+
+# ======== Время эпохи обучения: паддинг до 512 против динамического паддинга ========
+def benchmark_training(rows):
+    from transformers import (
+        AutoModelForSequenceClassification, AutoTokenizer, DataCollatorWithPadding,
+        TrainingArguments, Trainer
+    )
+    from utilities.training_data import SentimentDataset, dataset_cache_key, tokenize_dataset
+
+    model_name = "ozm-gg/ML_Pandas_AI_LearningLab_2025"
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    texts = sample_texts(rows)
+    labels = [SAMPLE_SCORES[i % len(SAMPLE_SCORES)] for i in range(rows)]
+
+    # Задания обучения загружают токенизатор из своего каталога: ключ кэша от пути зависеть не должен
+    keys = set()
+    for _ in range(2):
+        with tempfile.TemporaryDirectory() as job_dir:
+            tokenizer.save_pretrained(job_dir)
+            keys.add(dataset_cache_key(texts, labels, AutoTokenizer.from_pretrained(job_dir), 512))
+    assert len(keys) == 1, "dataset cache key depends on the tokenizer path"
+    print("dataset cache key is stable across job directories")
+
+    def epoch_time(dataset, data_collator, group_by_length):
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        with tempfile.TemporaryDirectory() as output_dir:
+            training_args = TrainingArguments(
+                output_dir=output_dir,
+                learning_rate=3e-6,
+                num_train_epochs=1,
+                per_device_train_batch_size=3,
+                group_by_length=group_by_length,
+                save_strategy="no",
+                report_to=[],
+            )
+            trainer = Trainer(model=model, args=training_args, train_dataset=dataset, data_collator=data_collator)
+            start = time.perf_counter()
+            trainer.train()
+            return time.perf_counter() - start
+
+    seconds = epoch_time(SentimentDataset(texts, labels, tokenizer), None, False)
+    report("epoch, padding to 512 (before)", seconds, rows)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        dataset = tokenize_dataset(texts, labels, tokenizer, cache_dir=cache_dir)
+        report("pre-tokenization (once, cached)", time.perf_counter() - start, rows)
+        seconds = epoch_time(dataset, DataCollatorWithPadding(tokenizer), True)
+        report("epoch, dynamic padding (after)", seconds, rows)
+
+
+# ======== ONNX Runtime против PyTorch: совпадение предсказаний и пропускная способность ========
+# Минимальная доля совпадающих с torch меток. int8 допускается меньше: динамическая квантизация весов
+# сдвигает score, и тексты у границы между метками могут перейти в соседнюю метку
+ONNX_MIN_AGREEMENT = {"onnx fp32": 0.99, "onnx int8": 0.95}
+# Наибольшее расхождение score для fp32: отличия только из-за порядка операций с плавающей точкой
+ONNX_FP32_MAX_DIFF = 1e-3
+
+
+def benchmark_onnx(rows, batch_size=32, max_length=512):
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    from utilities.inference import score_to_label
+    from utilities.inference_backends import TorchBackend, OnnxBackend, export_onnx
+
+    model_name = os.environ.get("MODEL_PATH", "ozm-gg/ML_Pandas_AI_LearningLab_2025")
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    texts = sample_texts(rows)
+
+    backends = {"torch": TorchBackend(model, tokenizer)}
+    with tempfile.TemporaryDirectory() as onnx_dir:
+        backends["onnx fp32"] = OnnxBackend(
+            export_onnx(model, os.path.join(onnx_dir, "model.onnx")), tokenizer, model.config
+        )
+        backends["onnx int8"] = OnnxBackend(
+            export_onnx(model, os.path.join(onnx_dir, "model-q.onnx"), quantize=True), tokenizer, model.config
+        )
+
+        results = {}
+        for name, backend in backends.items():
+            backend.predict(texts[:batch_size], batch_size, max_length)
+            start = time.perf_counter()
+            results[name] = backend.predict(texts, batch_size, max_length)
+            seconds = time.perf_counter() - start
+            report(f"{name} ({rows / seconds:.1f} rows/s)", seconds, rows)
+
+    reference = results["torch"]
+    for name, scores in results.items():
+        if name == "torch":
+            continue
+        max_diff = max(abs(a - b) for a, b in zip(reference, scores))
+        agreement = sum(
+            score_to_label(a) == score_to_label(b) for a, b in zip(reference, scores)
+        ) / len(reference)
+        print(f"{name:<40} max |score diff| = {max_diff:.5f}  label agreement = {agreement:.2%}")
+        assert agreement >= ONNX_MIN_AGREEMENT[name], (
+            f"{name} label agreement {agreement:.2%} is below {ONNX_MIN_AGREEMENT[name]:.0%}"
+        )
+        if name == "onnx fp32":
+            assert max_diff <= ONNX_FP32_MAX_DIFF, f"{name} max score diff {max_diff:.5f} exceeds {ONNX_FP32_MAX_DIFF}"
+    print("onnx predictions match torch within thresholds")
+
+
+# ======== Разбор экспорта Telegram: BeautifulSoup против потокового lxml ========
+def telegram_page(parts):
+    return "".join(
+        ['<html><head><meta charset="utf-8"/></head><body><div class="page_wrap">'
+         '<div class="page_header"><div class="text bold">Тестовый чат</div></div>'
+         '<div class="history">'
+         '<div class="message service" id="message-1"><div class="body details">1 января 2024</div></div>']
+        + parts
+        + ['</div></div></body></html>']
+    )
+
+
+def synthetic_telegram_messages(messages):
+    senders = ["Иван", "Мария", "Пётр"]
+    parts = []
+    for i in range(messages):
+        text = SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)].replace("<", "&lt;")
+        title = f"{1 + i % 28:02d}.01.2024 {i % 24:02d}:{i % 60:02d}:00 UTC+03:00"
+        date = f'<div class="pull_right date details" title="{title}">{i % 24:02d}:{i % 60:02d}</div>'
+        if i % 5 == 1:
+            # Сообщение того же отправителя без from_name
+            parts.append(
+                f'<div class="message default clearfix joined" id="message{i}"><div class="body">'
+                f'{date}<div class="text">{text}</div></div></div>'
+            )
+        elif i % 7 == 3:
+            # Пересланное сообщение
+            parts.append(
+                f'<div class="message default clearfix" id="message{i}"><div class="body">{date}'
+                f'<div class="from_name">{senders[i % 3]}</div><div class="forwarded body">'
+                f'<div class="from_name">Анна Сергеевна<span class="date details"> 31.12.2023 10:00:00</span></div>'
+                f'<div class="text">{text}<br/>вторая строка</div></div></div></div>'
+            )
+        else:
+            parts.append(
+                f'<div class="message default clearfix" id="message{i}"><div class="body">{date}'
+                f'<div class="from_name">{senders[i % 3]}</div><div class="text">{text}</div></div></div>'
+            )
+    return parts
+
+
+def synthetic_telegram_export(messages):
+    return telegram_page(synthetic_telegram_messages(messages))
+
+
+def synthetic_telegram_zip(messages, pages=3):
+    # Экспорт, разбитый на страницы messages.html, messages2.html, ...; в архиве они лежат не по порядку
+    parts = synthetic_telegram_messages(messages)
+    size = -(-len(parts) // pages)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for page in reversed(range(pages)):
+            name = "ChatExport/messages.html" if page == 0 else f"ChatExport/messages{page + 1}.html"
+            archive.writestr(name, telegram_page(parts[page * size:(page + 1) * size]))
+    buffer.seek(0)
+    return buffer
+
+
+def benchmark_telegram(rows):
+    from utilities.HTML_parser import TelegramChatParser, get_parser_pool, parse_export_zip, shutdown_parser_pool
+
+    path = os.environ.get("TELEGRAM_EXPORT")
+    if path:
+        with open(path, "r", encoding="utf-8") as file:
+            html_content = file.read()
+    else:
+        html_content = synthetic_telegram_export(rows)
+    size_mb = len(html_content.encode("utf-8")) / 2 ** 20
+
+    start = time.perf_counter()
+    expected = TelegramChatParser(html_content, is_file=False).to_dataframe()
+    report(f"BeautifulSoup html.parser ({size_mb:.1f} MB)", time.perf_counter() - start, len(expected))
+
+    start = time.perf_counter()
+    actual = TelegramChatParser(html_content, is_file=False, streaming=True).to_dataframe()
+    report(f"streaming lxml iterparse ({size_mb:.1f} MB)", time.perf_counter() - start, len(actual))
+
+    pd.testing.assert_frame_equal(expected.reset_index(drop=True), actual.reset_index(drop=True))
+    print("streaming parser output is identical")
+
+    # Многостраничный экспорт в zip должен давать ту же таблицу, что и одна страница
+    # (порог 0 - разбор в пуле процессов даже для маленького архива)
+    expected = TelegramChatParser(synthetic_telegram_export(rows), is_file=False).to_dataframe()
+    for workers in (1, 2):
+        actual = parse_export_zip(synthetic_telegram_zip(rows), workers=workers, min_parallel_bytes=0)
+        pd.testing.assert_frame_equal(expected.reset_index(drop=True), actual)
+    print("zip export output is identical")
+
+    # Порог PARALLEL_MIN_BYTES: один процесс против прогретого пула на архивах разного размера
+    workers = max(2, min(4, os.cpu_count() or 1))
+    get_parser_pool(workers).submit(abs, 0).result()
+    for messages in (rows, rows * 10, rows * 50):
+        archive = synthetic_telegram_zip(messages, pages=4)
+        size_mb = archive.getbuffer().nbytes / 2 ** 20
+        for pool_workers in (1, workers):
+            archive.seek(0)
+            start = time.perf_counter()
+            actual = parse_export_zip(archive, workers=pool_workers, min_parallel_bytes=0)
+            report(f"zip {size_mb:.1f} MB, workers={pool_workers}", time.perf_counter() - start, len(actual))
+    shutdown_parser_pool()
+
+
+# ======== Нагрузочный тест: задержка /analyze_sentiment/ во время большого /csv_analysis/ ========
+def post_json(url, payload):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request) as response:
+        return response.read()
+
+
+def post_csv(url, csv_bytes, text_column):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"text_column\"\r\n\r\n{text_column}\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"load.csv\"\r\n"
+        f"Content-Type: text/csv\r\n\r\n"
+    ).encode("utf-8") + csv_bytes + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    request = urllib.request.Request(
+        url, data=body, headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+    with urllib.request.urlopen(request) as response:
+        # Читаем поток до конца, чтобы сервер действительно обработал весь файл
+        while response.read(65536):
+            pass
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def measure_latency(backend_url, requests_count):
+    latencies = []
+    texts = sample_texts(requests_count)
+    for text in texts:
+        start = time.perf_counter()
+        post_json(f"{backend_url}/analyze_sentiment/", {"text": text})
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report_latency(name, latencies):
+    print(
+        f"{name:<40} p50={percentile(latencies, 0.50):8.1f} ms  "
+        f"p95={percentile(latencies, 0.95):8.1f} ms  p99={percentile(latencies, 0.99):8.1f} ms"
+    )
+
+
+def benchmark_loadtest(rows, requests_count=200):
+    # Требует запущенного бэкенда: python app.py (адрес берётся из BACKEND_URL)
+    backend_url = os.environ.get("BACKEND_URL", "http://127.0.0.1:8000")
+    report_latency("analyze_sentiment idle", measure_latency(backend_url, requests_count))
+
+    csv_bytes = pd.DataFrame({"MessageText": sample_texts(rows)}).to_csv(index=False).encode("utf-8")
+    background = threading.Thread(
+        target=post_csv, args=(f"{backend_url}/csv_analysis/", csv_bytes, "MessageText")
+    )
+    background.start()
+    time.sleep(0.5)
+
+    latencies = measure_latency(backend_url, requests_count)
+    still_running = background.is_alive()
+    background.join()
+    report_latency("analyze_sentiment during csv_analysis", latencies)
+    if not still_running:
+        print(f"warning: csv_analysis of {rows} rows finished before the measurement, increase --rows")
+
+
+BENCHMARKS = {
+    "resources": benchmark_resources,
+    "fused": benchmark_fused,
+    "parallel": benchmark_parallel,
+    "training": benchmark_training,
+    "onnx": benchmark_onnx,
+    "telegram": benchmark_telegram,
+    "loadtest": benchmark_loadtest,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарки бэкенда SentimentPanda")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--rows", type=int, default=200)
+    args = parser.parse_args()
+
+    BENCHMARKS[args.benchmark](args.rows)
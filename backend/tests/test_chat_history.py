@@ -0,0 +1,33 @@
+import pandas as pd
+
+from utilities.chat_history import ChatHistoryStore
+from utilities.token_frequencies import LabelTokenFrequencies
+
+
+LABELS = ["LABEL_1", "LABEL_2", "LABEL_1", "LABEL_0"]
+TEXTS = ["отличный день", "плохой день", "отличный фильм", "обычный день"]
+
+
+def test_frequencies_continue_from_saved_state(tmp_path):
+    # Частоты, продолженные с сохранённого состояния, совпадают с подсчётом по всему чату сразу
+    full = LabelTokenFrequencies(top_k=5, capacity=5)
+    full.update(LABELS, TEXTS)
+
+    store = ChatHistoryStore(str(tmp_path))
+    first = LabelTokenFrequencies(top_k=5, capacity=5)
+    first.update(LABELS[:2], TEXTS[:2])
+    store.save("chat", pd.DataFrame({"MessageId": [1, 2]}), first.state())
+
+    second = LabelTokenFrequencies(top_k=5, capacity=5)
+    second.restore(store.load_frequencies("chat"))
+    second.update(LABELS[2:], TEXTS[2:])
+    assert second.to_dict() == full.to_dict()
+
+
+def test_delete_removes_frequencies(tmp_path):
+    store = ChatHistoryStore(str(tmp_path))
+    store.save("chat", pd.DataFrame({"MessageId": [1]}), {})
+    assert store.load_frequencies("chat") == {}
+    assert store.delete("chat")
+    assert store.load("chat") is None
+    assert store.load_frequencies("chat") is None
@@ -0,0 +1,42 @@
+import io
+
+import pandas as pd
+import pytest
+
+from utilities.csv_schema import complete_records, sniff_csv_format
+
+
+def make_csv(delimiter, rows=200):
+    # Многострочные отзывы в кавычках с запятыми внутри: обрыв выборки внутри такого поля
+    # не должен сбивать определение разделителя
+    lines = [delimiter.join(["id", "text", "label"])]
+    for i in range(rows):
+        text = f'"Отзыв {i}, хороший, очень, хороший\nвторая, строка, тут\nитог, строка, {i % 3}"'
+        lines.append(delimiter.join([str(i), text, str(i % 3)]))
+    return "\n".join(lines) + "\n"
+
+
+@pytest.mark.parametrize("delimiter", [";", "\t", "|"])
+@pytest.mark.parametrize("encoding", ["utf-8", "cp1251"])
+def test_sniff_truncated_multiline_records(delimiter, encoding):
+    data = make_csv(delimiter).encode(encoding)
+    # Выборка обрывается в разных местах, в том числе внутри полей в кавычках
+    for sample_size in range(40, 4000, 7):
+        source = io.BytesIO(data)
+        assert sniff_csv_format(source, sample_size=sample_size) == (delimiter, encoding)
+        assert source.tell() == 0
+
+
+def test_complete_records_drops_cut_record():
+    text = make_csv(";")
+    cut = text[:text.index("вторая", 300)]
+    trimmed = complete_records(cut, ";")
+    assert trimmed.endswith("\n")
+    df = pd.read_csv(io.StringIO(trimmed), sep=";")
+    assert list(df.columns) == ["id", "text", "label"]
+    assert df["text"].str.contains("итог").all()
+
+
+def test_sniff_short_file():
+    source = io.BytesIO("a;b\n1;2\n".encode("utf-8"))
+    assert sniff_csv_format(source) == (";", "utf-8")
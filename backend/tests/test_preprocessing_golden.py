@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from utilities.data_preprocessing import DIGITS_RE, DataPreprocessor
+
+
+# Эталонные результаты записаны на исходной (baseline) версии DataPreprocessor: поэтапный конвейер
+# remove_names_natasha -> удаление цифр -> clean_text -> remove_stopwords -> lemmatize_text.
+# Сравнение с зафиксированными строками ловит регрессию, даже если она одинаково затронула оба пути
+GOLDEN = [
+    ('Я в восторге от этой поездки! Всё было просто замечательно, и погода порадовала солнечными днями.', 'восторг поездка всё просто замечательный погода порадовать солнечный день'),
+    ('Этот фильм оставил невероятное впечатление! Отличная игра актёров и потрясающий сюжет.', 'фильм оставить невероятный впечатление отличный игра актёр потрясать сюжет'),
+    ('Я очень доволен покупкой! Товар полностью соответствует описанию, качество на высоте.', 'очень довольный покупка товар полностью соответствовать описание качество высота'),
+    ('Как же приятно, когда тебя окружают такие добрые и заботливые люди!', 'приятно окружать такой добрый заботливый человек'),
+    ('Этот ресторан превзошёл все мои ожидания! Вкусная еда, уютная атмосфера и отличное обслуживание.', 'ресторан превзойти мой ожидание вкусный еда уютный атмосфера отличный обслуживание'),
+    ('Вчера весь день шёл дождь, но к вечеру стало немного теплее.', 'вчера весь день идти дождь вечер стать немного тёплый'),
+    ('Я заказал новый телефон, он пришёл в срок. Пока изучаю его функции.', 'заказать новый телефон прийти срок пока изучать функция'),
+    ('Этот фильм был обычным. Ничего особенного, но и не сказать, что он плох.', 'фильм обычный особенный не сказать плохой'),
+    ('Магазин работает до 22:00, так что успел купить всё необходимое.', 'магазин работать успеть купить всё необходимый'),
+    ('Сегодня среда, и я просто занимаюсь своими обычными делами.', 'сегодня среда просто заниматься свой обычный дело'),
+    ('Этот день был ужасным. Всё пошло не так с самого утра, и настроение испортилось окончательно.', 'день ужасный всё пойти не сам утро настроение испортиться окончательно'),
+    ('Я разочарован качеством этого товара. Он сломался буквально через два дня после покупки.', 'разочаровать качество товар сломаться буквально день покупка'),
+    ('Фильм оказался очень скучным, я еле досмотрел его до конца.', 'фильм оказаться очень скучный еле досмотреть конец'),
+    ('Обслуживание в этом кафе оставляет желать лучшего. Пришлось ждать заказ больше часа!', 'обслуживание кафе оставлять желать хороший прийтись ждать заказ час'),
+    ('Мне так грустно… Ожидания не оправдались, и я чувствую полное разочарование.', 'грустно ожидание не оправдаться чувствовать полный разочарование'),
+    ('Анна Сергеевна написала: встречаемся в 10 у входа, ссылка https://example.com/meet', 'написать встречаться вход ссылка'),
+    ('', ''),
+    ('   ', ''),
+    ('12345 678', ''),
+    ('абв123где и 42 кота', 'абв кот'),
+    ('Кто-то где-то — как-нибудь...', ''),
+    ("<b>Жирный</b> текст <a href='x'>ссылка</a>", 'жирный текст ссылка'),
+    ('Смотри www.example.com и https://t.me/chat?x=1 тоже', 'смотреть'),
+    ('Ёлка, ЁЖИК и ещё   много\n\tпробелов', 'ёжик ещё пробел'),
+    ('Latin words only here', ''),
+    ('Не очень хорошо, но и не ужасно', 'не очень хорошо не ужасно'),
+    ('Пётр Ильич Чайковский написал «Щелкунчика» в 1892 году', 'написать щелкунчик год'),
+]
+
+
+@pytest.fixture(scope="module")
+def preprocessor():
+    return DataPreprocessor(text_column="MessageText")
+
+
+@pytest.mark.parametrize("text, expected", GOLDEN)
+def test_preprocess_document_matches_baseline(preprocessor, text, expected):
+    assert preprocessor.preprocess_document(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", GOLDEN)
+def test_staged_pipeline_matches_baseline(preprocessor, text, expected):
+    text = preprocessor.remove_names_natasha(text)
+    text = DIGITS_RE.sub('', text)
+    text = preprocessor.clean_text(text)
+    text = preprocessor.remove_stopwords(text)
+    assert preprocessor.lemmatize_text(text) == expected
+
+
+def test_preprocess_dataset_matches_baseline(preprocessor):
+    texts = [text for text, _ in GOLDEN]
+    result = preprocessor.preprocess_dataset(pd.DataFrame({"MessageText": texts}))
+
+    # Строки только из пробелов отбрасываются до предобработки
+    expected_index = [index for index, text in enumerate(texts) if text.strip()]
+    assert result.index.tolist() == expected_index
+    assert result["MessageText"].tolist() == [GOLDEN[index][1] for index in expected_index]
@@ -1,12 +1,80 @@
 from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
+import io
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import zipfile
 import pandas as pd
 
 
+# Страницы экспорта Telegram Desktop: messages.html, messages2.html, ..., messagesN.html
+PAGE_NAME_RE = re.compile(r'(?:^|/)messages(\d*)\.html$')
+# Идентификатор сообщения в экспорте: <div class="message ..." id="message12345">
+MESSAGE_ID_RE = re.compile(r'^message(-?\d+)$')
+COLUMNS = ['Sender', 'Message', 'Date', 'Time', 'MessageId']
+# Страницы разбираются в нескольких процессах, только если их суммарный размер не меньше порога:
+# на небольших экспортах передача строк между процессами съедает выигрыш (python benchmark.py telegram)
+PARALLEL_MIN_BYTES = 16 * 1024 * 1024
+
+_parser_pool = None
+_parser_pool_workers = 0
+_parser_pool_lock = threading.RLock()
+
+
+def has_class(element, class_name):
+    return class_name in (element.get('class') or '').split()
+
+
+def has_exact_class(element, class_value):
+    # Аналог поиска BeautifulSoup по строке с пробелами: сравнивается весь атрибут class целиком
+    return ' '.join((element.get('class') or '').split()) == class_value
+
+
+def find_div(element, predicate):
+    for div in element.iterdescendants('div'):
+        if predicate(div):
+            return div
+    return None
+
+
+def iter_text(element, skip=None):
+    # Тексты узлов в порядке документа, как их собирает BeautifulSoup.get_text; комментарии пропускаются
+    if element.text and isinstance(element.tag, str):
+        yield element.text
+    for child in element:
+        if isinstance(child.tag, str) and not (skip and skip(child)):
+            yield from iter_text(child, skip)
+        if child.tail:
+            yield child.tail
+
+
+def get_text(element, separator='', skip=None):
+    return separator.join(part.strip() for part in iter_text(element, skip) if part.strip())
+
+
+def parse_message_id(value):
+    match = MESSAGE_ID_RE.match(value or '')
+    return int(match.group(1)) if match else None
+
+
+def messages_dataframe(messages):
+    df = pd.DataFrame(messages, columns=COLUMNS)
+    df['MessageId'] = df['MessageId'].astype('Int64')
+    return df[df['Message'].str.strip() != ""]
+
+
 class TelegramChatParser:
-    def __init__(self, html_content, is_file=True):
+    def __init__(self, html_content, is_file=True, streaming=False):
         self.html_content = html_content
         self.is_file = is_file
+        # Потоковый режим: lxml iterparse без построения полного дерева документа
+        self.streaming = streaming
         self.messages = []
+        # Отправитель после последнего сообщения: нужен, чтобы продолжить следующую страницу экспорта
+        self.last_sender = None
 
     def extract_name(self, from_name_tag):
         try:
@@ -20,6 +88,10 @@ class TelegramChatParser:
             raise
 
     def parse(self):
+        if self.streaming:
+            self.messages.extend(self.iter_messages())
+            return
+
         try:
             if self.is_file:
                 with open(self.html_content, 'r', encoding='utf-8') as file:
@@ -57,16 +129,175 @@ class TelegramChatParser:
                         if extracted_name:
                             sender_name = extracted_name
 
-                    self.messages.append([sender_name, text_content, date_str, time_display])
+                    self.messages.append([
+                        sender_name, text_content, date_str, time_display, parse_message_id(message.get('id'))
+                    ])
+
+            self.last_sender = sender_name
         except Exception as e:
             print(f"Error in parse: {e}")
             raise
 
+    def open_source(self):
+        if self.is_file or hasattr(self.html_content, 'read'):
+            return self.html_content
+        if isinstance(self.html_content, str):
+            return io.BytesIO(self.html_content.encode('utf-8'))
+        return io.BytesIO(self.html_content)
+
+    def iter_messages(self):
+        from lxml import etree
+
+        try:
+            sender_name = None
+            events = etree.iterparse(
+                self.open_source(), events=('end',), tag='div', html=True, recover=True, encoding='utf-8'
+            )
+            for _, message in events:
+                if not has_class(message, 'message'):
+                    continue
+
+                sender = find_div(message, lambda div: has_class(div, 'from_name'))
+                text = find_div(message, lambda div: has_class(div, 'text'))
+                date_tag = find_div(message, lambda div: has_exact_class(div, 'pull_right date details'))
+
+                # Обработка даты и времени
+                date_str = ''
+                time_display = ''
+                title = date_tag.get('title') if date_tag is not None else None
+                if title is not None and ' ' in title:
+                    date_split = title.split(' ', 1)
+                    date_str = date_split[0]
+                    time_part = date_split[1].split(' ', 1)[0]
+                    time_display = time_part[:5]  # Берем часы и минуты
+
+                if sender is not None:
+                    sender_name = get_text(sender)
+
+                if text is not None:
+                    text_content = get_text(text, ' ')
+
+                    forwarded = find_div(message, lambda div: has_exact_class(div, 'forwarded body'))
+                    if forwarded is not None:
+                        forwarded_sender = find_div(forwarded, lambda div: has_class(div, 'from_name'))
+                        if forwarded_sender is not None:
+                            extracted_name = get_text(
+                                forwarded_sender,
+                                skip=lambda child: child.tag == 'span' and has_exact_class(child, 'date details')
+                            )
+                            if extracted_name:
+                                sender_name = extracted_name
+
+                    self.last_sender = sender_name
+                    yield [sender_name, text_content, date_str, time_display, parse_message_id(message.get('id'))]
+
+                self.last_sender = sender_name
+
+                # Обработанное сообщение и всё, что было перед ним, больше не нужны
+                message.clear(keep_tail=True)
+                parent = message.getparent()
+                while parent is not None and message.getprevious() is not None:
+                    del parent[0]
+        except Exception as e:
+            print(f"Error in iter_messages: {e}")
+            raise
+
     def to_dataframe(self):
         try:
             self.parse()
-            df = pd.DataFrame(self.messages, columns=['Sender', 'Message', 'Date', 'Time'])
-            return df[df['Message'].str.strip() != ""]
+            return messages_dataframe(self.messages)
         except Exception as e:
             print(f"Error in to_dataframe: {e}")
-            raise
\ No newline at end of file
+            raise
+
+
+# ======== Экспорт из нескольких страниц ========
+def get_parser_pool(workers):
+    # Пул живёт между запросами: запуск spawn-процессов стоит секунды, больше чем разбор обычного экспорта
+    global _parser_pool, _parser_pool_workers
+    with _parser_pool_lock:
+        if _parser_pool is None or _parser_pool_workers != workers:
+            shutdown_parser_pool()
+            _parser_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _parser_pool_workers = workers
+        return _parser_pool
+
+
+def shutdown_parser_pool():
+    global _parser_pool, _parser_pool_workers
+    with _parser_pool_lock:
+        if _parser_pool is not None:
+            _parser_pool.shutdown(wait=True, cancel_futures=True)
+            _parser_pool = None
+            _parser_pool_workers = 0
+
+
+def page_number(name):
+    match = PAGE_NAME_RE.search(name.replace('\\', '/'))
+    return int(match.group(1) or 1)
+
+
+def parse_page(path):
+    parser = TelegramChatParser(path, is_file=True, streaming=True)
+    return list(parser.iter_messages()), parser.last_sender
+
+
+def stitch_pages(parsed_pages):
+    # Сообщения в начале страницы без from_name принадлежат последнему отправителю предыдущей страницы
+    messages = []
+    carried_sender = None
+    for page_messages, last_sender in parsed_pages:
+        for message in page_messages:
+            if message[0] is None:
+                message[0] = carried_sender
+            messages.append(message)
+        if last_sender is not None:
+            carried_sender = last_sender
+    return messages
+
+
+def parse_export_pages(paths, workers=1, min_parallel_bytes=PARALLEL_MIN_BYTES):
+    try:
+        # Страницы нумеруются по порядку времени, поэтому сортировка по номеру даёт хронологию
+        paths = sorted(paths, key=page_number)
+        total_bytes = sum(os.path.getsize(path) for path in paths)
+        if workers > 1 and len(paths) > 1 and total_bytes >= min_parallel_bytes:
+            parsed_pages = list(get_parser_pool(workers).map(parse_page, paths))
+        else:
+            parsed_pages = [parse_page(path) for path in paths]
+
+        return messages_dataframe(stitch_pages(parsed_pages)).reset_index(drop=True)
+    except Exception as e:
+        print(f"Error in parse_export_pages: {e}")
+        raise
+
+
+def parse_export_zip(source, workers=1, min_parallel_bytes=PARALLEL_MIN_BYTES):
+    try:
+        with zipfile.ZipFile(source) as archive, tempfile.TemporaryDirectory() as tmp_dir:
+            names = [name for name in archive.namelist() if PAGE_NAME_RE.search(name)]
+            if not names:
+                raise ValueError("В архиве нет страниц messages*.html")
+            # Порядок страниц определяется по именам в архиве, до распаковки
+            names.sort(key=page_number)
+
+            # Страницы распаковываются на диск, рабочие процессы читают их потоково.
+            # Каждая страница - в своём подкаталоге под исходным именем: в архиве могут быть
+            # одноимённые страницы из разных папок
+            paths = []
+            for index, name in enumerate(names):
+                page_dir = os.path.join(tmp_dir, str(index))
+                os.makedirs(page_dir)
+                path = os.path.join(page_dir, os.path.basename(name))
+                with archive.open(name) as page, open(path, 'wb') as output:
+                    while True:
+                        chunk = page.read(1 << 20)
+                        if not chunk:
+                            break
+                        output.write(chunk)
+                paths.append(path)
+
+            return parse_export_pages(paths, workers=workers, min_parallel_bytes=min_parallel_bytes)
+    except Exception as e:
+        print(f"Error in parse_export_zip: {e}")
+        raise
@@ -0,0 +1,219 @@
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+# Размер группы строк в Parquet: постраничное чтение результата читает только нужные группы
+ROW_GROUP_SIZE = 10000
+
+
+class AnalysisJobQueue:
+    # Фоновые задания анализа: ограниченная очередь с приоритетом маленьких файлов и пул рабочих потоков.
+    # Статус каждого задания хранится в JSON, результат - в Parquet, поэтому они переживают перезапуск
+    def __init__(self, run_job, results_dir="./analysis_jobs", workers=1, max_queued=16):
+        self.run_job = run_job
+        self.results_dir = results_dir
+        self.workers = workers
+        self.queue = queue.PriorityQueue(maxsize=max_queued)
+        # Порядковый номер разрешает равенство приоритетов в порядке поступления
+        self.counter = itertools.count()
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.threads = []
+        self.stopping = threading.Event()
+        os.makedirs(results_dir, exist_ok=True)
+        self.load_jobs()
+
+    def meta_path(self, job_id):
+        return os.path.join(self.results_dir, f"{job_id}.json")
+
+    def result_path(self, job_id):
+        return os.path.join(self.results_dir, f"{job_id}.parquet")
+
+    def load_jobs(self):
+        for name in os.listdir(self.results_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.results_dir, name), "r", encoding="utf-8") as file:
+                    job = json.load(file)
+            except (OSError, ValueError) as e:
+                print(f"Error in AnalysisJobQueue.load_jobs: {e}")
+                continue
+            if job["status"] not in TERMINAL_STATUSES:
+                # Очередь живёт в памяти: незавершённые до перезапуска задания нужно отправить заново
+                job.update(status="failed", error="Задание прервано перезапуском сервера", finished_at=time.time())
+                self.write_meta(job)
+            self.jobs[job["job_id"]] = job
+
+    def write_meta(self, job):
+        tmp_path = f"{self.meta_path(job['job_id'])}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(job, file, ensure_ascii=False)
+        os.replace(tmp_path, self.meta_path(job["job_id"]))
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self.worker, name=f"analysis-job-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        # Выполняющееся задание не прерывается: после перезапуска оно будет помечено как прерванное
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join(timeout=5)
+        self.threads = []
+
+    def submit(self, params, size):
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "params": params,
+            "size": size,
+            "status": "queued",
+            "rows_done": 0,
+            "rows_total": None,
+            "eta": None,
+            "error": None,
+            "summary": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        with self.lock:
+            # queue.Full пробрасывается наверх: вызывающий код отвечает клиенту, что очередь занята
+            self.queue.put_nowait((size, next(self.counter), job_id))
+            self.jobs[job_id] = job
+            self.write_meta(job)
+        return job_id
+
+    def update(self, job_id, **fields):
+        with self.lock:
+            job = self.jobs[job_id]
+            job.update(fields)
+            self.write_meta(job)
+            return dict(job)
+
+    def progress(self, job_id, rows_done, rows_total):
+        with self.lock:
+            job = self.jobs[job_id]
+            elapsed = time.time() - job["started_at"]
+            job["rows_done"] = rows_done
+            job["rows_total"] = rows_total
+            job["eta"] = elapsed / rows_done * (rows_total - rows_done) if rows_done else None
+            # Прогресс хранится только в памяти, JSON перезаписывается при смене статуса.
+            # Возвращает True, если задание нужно прервать
+            return job["status"] == "cancelling"
+
+    def worker(self):
+        while not self.stopping.is_set():
+            try:
+                _, _, job_id = self.queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                if self.status(job_id)["status"] != "queued":
+                    continue
+                job = self.update(job_id, status="running", started_at=time.time())
+
+                result = self.run_job(job["params"], lambda done, total: self.progress(job_id, done, total))
+                if result is None:
+                    self.update(job_id, status="cancelled", eta=None, finished_at=time.time())
+                    continue
+
+                # Таблица строк уходит в Parquet, небольшая сводка (частоты токенов) - в JSON статуса
+                df, summary = result
+                tmp_path = f"{self.result_path(job_id)}.tmp"
+                df.reset_index(drop=True).to_parquet(tmp_path, index=False, row_group_size=ROW_GROUP_SIZE)
+                os.replace(tmp_path, self.result_path(job_id))
+                self.update(
+                    job_id, status="completed", rows_done=len(df), rows_total=len(df), eta=0,
+                    summary=summary, finished_at=time.time()
+                )
+            except Exception as e:
+                print(f"Error in AnalysisJobQueue.worker: {e}")
+                self.update(job_id, status="failed", error=str(e), eta=None, finished_at=time.time())
+            finally:
+                self.queue.task_done()
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            if job["status"] == "queued":
+                # Из PriorityQueue нельзя удалить элемент: рабочий поток пропустит задание сам
+                job.update(status="cancelled", finished_at=time.time())
+            elif job["status"] == "running":
+                job["status"] = "cancelling"
+            self.write_meta(job)
+            return dict(job)
+
+    def delete(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            if job["status"] not in TERMINAL_STATUSES:
+                raise RuntimeError("Задание ещё выполняется")
+            del self.jobs[job_id]
+            for path in (self.meta_path(job_id), self.result_path(job_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def status(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            return dict(job, queued=self.queue.qsize())
+
+    def list_jobs(self):
+        with self.lock:
+            # Сводка не входит в список: её получают через статус конкретного задания
+            jobs = [{key: value for key, value in job.items() if key != "summary"} for job in self.jobs.values()]
+        return sorted(jobs, key=lambda job: job["created_at"], reverse=True)
+
+    def result(self, job_id):
+        job = self.status(job_id)
+        if job["status"] != "completed":
+            raise ValueError(f"Задание {job_id} не завершено: {job['status']}")
+        return self.result_path(job_id)
+
+    def rows(self, job_id, offset, limit):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(self.result(job_id))
+        rows_total = parquet.metadata.num_rows
+        tables = []
+        first_row = None
+        group_start = 0
+        for index in range(parquet.num_row_groups):
+            group_rows = parquet.metadata.row_group(index).num_rows
+            if group_start + group_rows > offset and group_start < offset + limit:
+                if first_row is None:
+                    first_row = group_start
+                tables.append(parquet.read_row_group(index))
+            group_start += group_rows
+
+        if not tables:
+            return parquet.schema_arrow.empty_table().to_pandas(), rows_total
+        page = pa.concat_tables(tables).slice(offset - first_row, limit)
+        return page.to_pandas(), rows_total
+
+    def metrics(self):
+        with self.lock:
+            statuses = [job["status"] for job in self.jobs.values()]
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue.qsize(),
+            "max_queued": self.queue.maxsize,
+            **{status: statuses.count(status) for status in ("queued", "running", *TERMINAL_STATUSES)},
+        }
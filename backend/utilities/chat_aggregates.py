@@ -0,0 +1,49 @@
+import pandas as pd
+
+
+def message_timestamps(df):
+    # Один векторный разбор столбцов Date/Time вместо to_datetime для каждой строки
+    return pd.to_datetime(
+        df["Date"].astype(str) + " " + df["Time"].astype(str), format="%d.%m.%Y %H:%M", errors="coerce"
+    )
+
+
+def aggregate_by(df, key):
+    # Число сообщений каждой метки и средний score для каждого значения key
+    counts = df.groupby([key, "label"]).size().unstack(fill_value=0)
+    stats = df.groupby(key)["score"].agg(["size", "mean"])
+    return [
+        {
+            "key": value,
+            "counts": {label: int(count) for label, count in row.items()},
+            "total": int(stats.at[value, "size"]),
+            "mean_score": None if pd.isna(stats.at[value, "mean"]) else float(stats.at[value, "mean"]),
+        }
+        for value, row in counts.iterrows()
+    ]
+
+
+def aggregate_chat(df):
+    try:
+        if df.empty:
+            return {"rows_total": 0, "labels": {}, "by_sender": [], "by_day": [], "by_hour": []}
+
+        timestamps = message_timestamps(df)
+        data = pd.DataFrame({
+            "sender": df["Sender"].fillna("").astype(str),
+            "day": timestamps.dt.strftime("%Y-%m-%d"),
+            "hour": timestamps.dt.hour.astype("Int64"),
+            "label": df["label"],
+            "score": df["score"],
+        })
+        return {
+            "rows_total": len(data),
+            "labels": {label: int(count) for label, count in data["label"].value_counts().items()},
+            "by_sender": aggregate_by(data, "sender"),
+            # Сообщения без распознанной даты в ряды по дням и часам не попадают
+            "by_day": aggregate_by(data, "day"),
+            "by_hour": [dict(item, key=int(item["key"])) for item in aggregate_by(data, "hour")],
+        }
+    except Exception as e:
+        print(f"Error in aggregate_chat: {e}")
+        raise
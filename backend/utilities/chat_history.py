@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import pandas as pd
+
+
+class ChatHistoryStore:
+    # Результаты прошлых анализов чатов: один Parquet-файл на чат с размеченными сообщениями
+    # и JSON-файл рядом с ним с накопленными частотами токенов для облаков слов
+    def __init__(self, directory="./chat_history"):
+        self.directory = directory
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, chat_id):
+        # Идентификатор приходит от клиента, поэтому в имени файла только безопасные символы и хэш
+        name = re.sub(r'[^\w\-]', '_', chat_id)[:64]
+        digest = hashlib.sha1(chat_id.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.directory, f"{name}-{digest}.parquet")
+
+    def frequencies_path(self, chat_id):
+        return self.path(chat_id)[:-len(".parquet")] + ".frequencies.json"
+
+    def load(self, chat_id):
+        try:
+            path = self.path(chat_id)
+            if not os.path.exists(path):
+                return None
+            return pd.read_parquet(path)
+        except Exception as e:
+            print(f"Error in ChatHistoryStore.load: {e}")
+            raise
+
+    def load_frequencies(self, chat_id):
+        try:
+            path = self.frequencies_path(chat_id)
+            if not os.path.exists(path):
+                return None
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error in ChatHistoryStore.load_frequencies: {e}")
+            raise
+
+    @staticmethod
+    def last_message_id(df):
+        if df is None or df.empty or "MessageId" not in df.columns or df["MessageId"].isna().all():
+            return None
+        return int(df["MessageId"].max())
+
+    def save(self, chat_id, df, frequencies=None):
+        try:
+            path = self.path(chat_id)
+            tmp_path = f"{path}.tmp"
+            frequencies_path = self.frequencies_path(chat_id)
+            with self.lock:
+                if frequencies is not None:
+                    with open(f"{frequencies_path}.tmp", "w", encoding="utf-8") as f:
+                        json.dump(frequencies, f, ensure_ascii=False)
+                    os.replace(f"{frequencies_path}.tmp", frequencies_path)
+                elif os.path.exists(frequencies_path):
+                    # Частоты от прежней версии истории к новым строкам не относятся
+                    os.remove(frequencies_path)
+                df.reset_index(drop=True).to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error in ChatHistoryStore.save: {e}")
+            raise
+
+    def delete(self, chat_id):
+        with self.lock:
+            path = self.path(chat_id)
+            frequencies_path = self.frequencies_path(chat_id)
+            if os.path.exists(frequencies_path):
+                os.remove(frequencies_path)
+            if not os.path.exists(path):
+                return False
+            os.remove(path)
+            return True
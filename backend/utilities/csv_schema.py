@@ -0,0 +1,90 @@
+import codecs
+import csv
+import io
+
+
+# Для определения формата достаточно начала файла
+SAMPLE_SIZE = 64 * 1024
+DELIMITERS = ",;\t|"
+
+
+def detect_encoding(sample):
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    # Если выборка не UTF-8, пробуем типичную для русских выгрузок из Excel cp1251
+    for encoding in ("utf-8", "cp1251"):
+        try:
+            # final=False: выборка может обрываться посреди многобайтового символа
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return "latin-1"
+
+
+def complete_lines(text):
+    # Последняя строка выборки может быть обрезана
+    end = text.rfind("\n")
+    return text[:end + 1] if end > 0 else text
+
+
+def complete_records(text, delimiter):
+    # Выборка может оборваться внутри поля в кавычках с переводами строк (многострочные отзывы):
+    # оставляем только записи, которые csv.reader прочитал целиком, последняя отбрасывается
+    lines = list(io.StringIO(text, newline=""))
+    consumed = 0
+
+    def feed():
+        nonlocal consumed
+        for line in lines:
+            consumed += 1
+            yield line
+
+    ends = []
+    try:
+        for _ in csv.reader(feed(), delimiter=delimiter):
+            ends.append(consumed)
+    except csv.Error:
+        pass
+    if len(ends) < 2:
+        return text
+    return "".join(lines[:ends[-2]])
+
+
+def detect_delimiter(text):
+    try:
+        return csv.Sniffer().sniff(complete_lines(text), delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+
+def record_widths(text, delimiter):
+    try:
+        return {len(row) for row in csv.reader(io.StringIO(text, newline=""), delimiter=delimiter) if row}
+    except csv.Error:
+        return set()
+
+
+def trim_records(text, delimiter):
+    # Границы записей зависят от разделителя (кавычки учитываются только в начале поля), а Sniffer
+    # на выборке, оборванной внутри многострочного поля, ошибается. Разделитель подтверждается тем,
+    # что все полные записи имеют одинаковое число столбцов; первой проверяется исходная догадка
+    for candidate in dict.fromkeys(delimiter + DELIMITERS):
+        trimmed = complete_records(text, candidate)
+        widths = record_widths(trimmed, candidate)
+        if len(widths) == 1 and widths.pop() > 1:
+            return trimmed, candidate
+    return complete_records(text, delimiter), delimiter
+
+
+def sniff_csv_format(source, sample_size=SAMPLE_SIZE):
+    # Читает только начало файла и возвращает указатель в начало
+    sample = source.read(sample_size)
+    source.seek(0)
+    encoding = detect_encoding(sample)
+    text = sample.decode(encoding, errors="ignore")
+    delimiter = detect_delimiter(text)
+    if len(sample) >= sample_size:
+        # Обрезанная выборка: разделитель уточняется по полностью прочитанным записям
+        delimiter = trim_records(text, delimiter)[1]
+    return delimiter, encoding
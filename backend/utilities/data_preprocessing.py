@@ -1,21 +1,88 @@
 import re
-from pymorphy3 import MorphAnalyzer
-from nltk.corpus import stopwords
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
 from nltk.tokenize import word_tokenize
-from natasha import NamesExtractor, MorphVocab
+
+from utilities.resources import get_resources, build_stopwords
+
+
+# Регулярные выражения компилируются один раз на процесс
+DIGITS_RE = re.compile(r'\b\d+\b')
+HTML_TAG_RE = re.compile(r'<[^>]*>', flags=re.MULTILINE)
+URL_RE = re.compile(r'https?://\S+|www\.\S+')
+NON_CYRILLIC_RE = re.compile(r'[^а-яА-ЯёЁ\s-]', flags=re.IGNORECASE)
+SEPARATORS_RE = re.compile(r'[\s-]+')
+
+_process_pool = None
+_process_pool_workers = 0
+# Пул запрашивают одновременно потоки bulk-исполнителя и фоновых заданий: без блокировки два потока
+# могли создать по пулу, и перезаписанный пул оставлял рабочие процессы. RLock - потому что
+# get_process_pool вызывает shutdown_process_pool
+_process_pool_lock = threading.RLock()
+
+
+def _init_worker():
+    # Каждый рабочий процесс один раз загружает свои морфоанализатор и ресурсы natasha
+    get_resources().warm_up()
+
+
+def _preprocess_chunk(text_column, chunk):
+    return DataPreprocessor(text_column=text_column).preprocess_dataset(chunk, workers=1)
+
+
+def get_process_pool(workers, start_method='spawn'):
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_workers != workers:
+            shutdown_process_pool()
+            _process_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(start_method),
+                initializer=_init_worker
+            )
+            _process_pool_workers = workers
+        return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=True, cancel_futures=True)
+            _process_pool = None
+            _process_pool_workers = 0
+
+
+def map_column(texts, func):
+    # Построчный этап без try/except на каждой строке: при ошибке индекс строки берётся из переменной цикла
+    results = []
+    index = None
+    try:
+        for index, text in zip(texts.index, texts.array):
+            results.append(func(text))
+    except Exception as e:
+        raise ValueError(f"Error in {func.__name__} at row {index!r}: {e}") from e
+    return pd.Series(results, index=texts.index, dtype=texts.dtype)
 
 
 class DataPreprocessor:
-    def __init__(self, text_column='MessageText'):
+    def __init__(self, text_column='MessageText', resources=None, workers=1, chunk_size=2000):
         self.text_column = text_column
-        self.morph = MorphAnalyzer(lang='ru')
+        # Параллельный режим включается при workers > 1 и датасете больше одного чанка
+        self.workers = workers
+        self.chunk_size = chunk_size
+        # Морфоанализатор, NamesExtractor и стоп-слова общие для всех запросов
+        self.resources = resources or get_resources()
+        self.morph = self.resources.morph
 
     def clean_text(self, text):
         try:
-            text = re.sub(r'<[^>]*>', ' ', text, flags=re.MULTILINE)
-            text = re.sub(r'https?://\S+|www\.\S+', ' ', text)
-            text = re.sub(r'[^а-яА-ЯёЁ\s-]', ' ', text, flags=re.IGNORECASE)
-            text = re.sub(r'[\s-]+', ' ', text)
+            text = HTML_TAG_RE.sub(' ', text)
+            text = URL_RE.sub(' ', text)
+            text = NON_CYRILLIC_RE.sub(' ', text)
+            text = SEPARATORS_RE.sub(' ', text)
             return text.strip().lower()
         except Exception as e:
             print(f"Error in clean_text with text: {text}\n{e}")
@@ -23,14 +90,10 @@ class DataPreprocessor:
 
     def remove_stopwords(self, text, language='russian'):
         try:
-            base_stopwords = set(stopwords.words(language))
-            keep_words = {
-                'не', 'ни', 'нет', 'без', 'никак', 'вовсе', 'отнюдь',  # Отрицания
-                'очень', 'совсем', 'абсолютно', 'совершенно', 'крайне',  # Интенсификаторы
-                'ли', 'ведь', 'либо', 'даже',  # Модальные частицы
-                'хорошо', 'плохо', 'ужасно', 'прекрасно'  # Оценочные прилагательные
-            }
-            final_stopwords = base_stopwords - keep_words
+            if language == self.resources.language:
+                final_stopwords = self.resources.stopwords
+            else:
+                final_stopwords = build_stopwords(language)
             words = word_tokenize(text, language=language)
             return ' '.join([w for w in words if w.lower() not in final_stopwords])
         except Exception as e:
@@ -42,8 +105,7 @@ class DataPreprocessor:
             words = word_tokenize(text, language='russian')
             lemmas = []
             for word in words:
-                parsed = self.morph.parse(word)[0]
-                lemmas.append(parsed.normal_form)
+                lemmas.append(self.resources.lemma_cache.lemmatize(word))
             return ' '.join(lemmas)
         except Exception as e:
             print(f"Error in lemmatize_text with text: {text}\n{e}")
@@ -51,8 +113,7 @@ class DataPreprocessor:
 
     def remove_names_natasha(self, text):
         try:
-            extractor = NamesExtractor(MorphVocab())
-            matches = extractor(text)
+            matches = self.resources.names_extractor(text)
             spans = []
 
             for match in matches:
@@ -72,14 +133,11 @@ class DataPreprocessor:
             print(f"Error in remove_names_natasha with text: {text}\n{e}")
             raise
 
-    def preprocess_dataset(self, df):
-        # Функция-обёртка для отлавливания ошибок на каждом шаге
-        def safe_apply(func, text):
-            try:
-                return func(text)
-            except Exception as e:
-                print(f"Error in function {func.__name__} for text: {text}\n{e}")
-                raise
+    def preprocess_dataset(self, df, workers=None, chunk_size=None):
+        workers = self.workers if workers is None else workers
+        chunk_size = chunk_size or self.chunk_size
+        if workers > 1 and len(df) > chunk_size:
+            return self.preprocess_dataset_parallel(df, workers, chunk_size)
 
         # Проверка наличия нужного столбца
         if self.text_column not in df.columns:
@@ -89,56 +147,68 @@ class DataPreprocessor:
 
         try:
             # Приводим столбец к строковому типу и удаляем пустые строки
-            df[self.text_column] = df[self.text_column].astype(str)
-            df = df[df[self.text_column].str.strip() != '']
+            texts = df[self.text_column].astype(str)
+            df = df[texts.str.strip() != '']
+            texts = texts.loc[df.index]
         except Exception as e:
             print("Error converting or filtering text column:", e)
             raise
 
-        # Удаление имен
+        # Удаление имен, цифр, очистка, удаление стоп-слов и лемматизация за один проход по строке
         try:
-            df[self.text_column] = df[self.text_column].apply(lambda x: safe_apply(self.remove_names_natasha, x))
+            df[self.text_column] = map_column(texts, self.preprocess_document)
         except Exception as e:
-            print("Error during remove_stopwords stage:", e)
+            print("Error during preprocess_document stage:", e)
             raise
 
-        # Замена цифр на пустую строку
-        try:
-            df[self.text_column] = df[self.text_column].str.replace(r'\b\d+\b', '', regex=True)
-        except Exception as e:
-            print("Error in regex replacement:", e)
-            raise
+        # Удаляем записи, где итоговый текст пустой
+        df = df.dropna(subset=[self.text_column])
+        return df
 
-        # Применяем по очереди функции очистки, удаления стоп-слов и лемматизации
-        try:
-            df[self.text_column] = df[self.text_column].apply(lambda x: safe_apply(self.clean_text, x))
-        except Exception as e:
-            print("Error during clean_text stage:", e)
-            raise
+    def preprocess_dataset_parallel(self, df, workers, chunk_size):
+        if self.text_column not in df.columns:
+            raise ValueError(
+                f"Column '{self.text_column}' not found in CSV. Available columns: {df.columns.tolist()}"
+            )
 
         try:
-            df[self.text_column] = df[self.text_column].apply(lambda x: safe_apply(self.remove_stopwords, x))
+            # В рабочие процессы отправляем только текстовый столбец, остальные остаются на месте
+            texts = df[[self.text_column]]
+            chunks = [texts.iloc[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+
+            pool = get_process_pool(workers)
+            # map сохраняет порядок чанков, поэтому индекс собирается в исходном порядке
+            processed = pd.concat(
+                pool.map(_preprocess_chunk, [self.text_column] * len(chunks), chunks)
+            )
+
+            result = df.loc[processed.index].copy()
+            result[self.text_column] = processed[self.text_column]
+            return result
         except Exception as e:
-            print("Error during remove_stopwords stage:", e)
+            print("Error in preprocess_dataset_parallel:", e)
             raise
 
+    def preprocess_document(self, text, remove_names=True):
         try:
-            df[self.text_column] = df[self.text_column].apply(lambda x: safe_apply(self.lemmatize_text, x))
+            if remove_names:
+                text = self.remove_names_natasha(text)
+            text = DIGITS_RE.sub('', text)
+            return self.lemmatize_words(self.clean_text(text))
         except Exception as e:
-            print("Error during lemmatize_text stage:", e)
+            print(f"Error in preprocess_document with text: {text}\n{e}")
             raise
 
-        # Удаляем записи, где итоговый текст пустой
-        df = df.dropna(subset=[self.text_column])
-        return df
+    def lemmatize_words(self, text):
+        # После clean_text остаются только кириллические слова в нижнем регистре,
+        # разделённые одиночными пробелами, поэтому word_tokenize здесь равносилен split()
+        stopwords = self.resources.stopwords
+        lemmatize = self.resources.lemma_cache.lemmatize
+        return ' '.join([lemmatize(word) for word in text.split() if word not in stopwords])
 
     def preprocess_text(self, text):
         try:
-            text = re.sub(r'\b\d+\b', '', text)
-            text = self.clean_text(text)
-            text = self.remove_stopwords(text)
-            text = self.lemmatize_text(text)
-            return text
+            return self.preprocess_document(text, remove_names=False)
         except Exception as e:
             print("Error in preprocess_text:", e)
             raise
\ No newline at end of file
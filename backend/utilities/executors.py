@@ -0,0 +1,55 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+_SENTINEL = object()
+
+
+class BlockingExecutor:
+    # Пул потоков для блокирующей работы с явным ограничением одновременных задач,
+    # чтобы тяжёлые запросы не занимали цикл событий asyncio
+    def __init__(self, name, max_workers=2, max_pending=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        # Сколько задач может одновременно стоять в очереди пула, остальные ждут в asyncio
+        self.max_pending = max_pending or max_workers * 2
+        self.semaphore = None
+        self.active = 0
+
+    async def run(self, func, *args, **kwargs):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_pending)
+
+        async with self.semaphore:
+            self.active += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+            finally:
+                self.active -= 1
+
+    def run_sync(self, func, *args, **kwargs):
+        # Вызов из обычного потока (шаг потоковой выдачи, фоновое задание): задача встаёт в очередь
+        # того же пула, поэтому одновременно выполняется не больше max_workers задач
+        return self.executor.submit(func, *args, **kwargs).result()
+
+    async def iterate(self, iterator):
+        # Каждый шаг синхронного генератора выполняется в пуле, а не в цикле событий
+        iterator = iter(iterator)
+        while True:
+            item = await self.run(next, iterator, _SENTINEL)
+            if item is _SENTINEL:
+                break
+            yield item
+
+    def metrics(self):
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "active": self.active,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,66 @@
+def score_to_label(score):
+    if score < -0.01:
+        return "Negative"
+    elif score > 0.10:
+        return "Positive"
+    else:
+        return "Neutral"
+
+
+class BatchInferenceEngine:
+    def __init__(self, model_handle, batch_size=32, max_length=512, cache=None):
+        self.model_handle = model_handle
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.cache = cache
+
+    def token_lengths(self, backend, texts):
+        try:
+            return backend.token_lengths(texts, self.max_length)
+        except Exception as e:
+            print(f"Error in token_lengths: {e}")
+            raise
+
+    def classify_batch(self, texts):
+        try:
+            texts = [str(text) for text in texts]
+            if not texts:
+                return []
+
+            # Весь вызов работает с одним снимком модели, даже если модель заменят посередине
+            snapshot = self.model_handle.acquire()
+
+            # Повторяющиеся тексты классифицируются один раз, уже известные берутся из кэша
+            unique_texts = list(dict.fromkeys(texts))
+            known = self.cache.get_many(unique_texts, snapshot.version) if self.cache is not None else {}
+            missing = [text for text in unique_texts if text not in known]
+
+            predicted = self.predict(snapshot.backend, missing)
+            if self.cache is not None:
+                self.cache.put_many(predicted, snapshot.version)
+            known.update(predicted)
+
+            # Результаты возвращаются в исходном порядке текстов
+            return [dict(known[text]) for text in texts]
+        except Exception as e:
+            print(f"Error in classify_batch: {e}")
+            raise
+
+    def predict(self, backend, texts):
+        if not texts:
+            return {}
+
+        # Сортируем по длине в токенах, чтобы внутри микробатча было минимум паддинга
+        lengths = self.token_lengths(backend, texts)
+        order = sorted(range(len(texts)), key=lambda i: lengths[i])
+
+        results = {}
+        for start in range(0, len(order), self.batch_size):
+            batch = [texts[i] for i in order[start:start + self.batch_size]]
+            scores = backend.predict(batch, self.batch_size, self.max_length)
+            for text, score in zip(batch, scores):
+                results[text] = {"label": score_to_label(score), "score": score}
+        return results
+
+    def classify(self, text):
+        return self.classify_batch([text])[0]
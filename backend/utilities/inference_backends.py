@@ -0,0 +1,192 @@
+import copy
+import os
+import re
+import threading
+import numpy as np
+
+
+# ======== Бэкенд на PyTorch (transformers pipeline) ========
+class TorchBackend:
+    name = "torch"
+
+    def __init__(self, model, tokenizer):
+        self.model = model.eval()
+        self.tokenizer = tokenizer
+        self.local = threading.local()
+
+    def pipeline(self):
+        from transformers import pipeline
+
+        # У каждого потока своя копия быстрого токенизатора: он не допускает одновременных вызовов
+        sentiment_pipeline = getattr(self.local, "pipeline", None)
+        if sentiment_pipeline is None:
+            sentiment_pipeline = pipeline(
+                "text-classification",
+                model=self.model,
+                tokenizer=copy.deepcopy(self.tokenizer)
+            )
+            self.local.pipeline = sentiment_pipeline
+        return sentiment_pipeline
+
+    def token_lengths(self, texts, max_length):
+        encoding = self.pipeline().tokenizer(texts, truncation=True, max_length=max_length)
+        return [len(ids) for ids in encoding["input_ids"]]
+
+    def predict(self, texts, batch_size, max_length):
+        outputs = self.pipeline()(texts, batch_size=batch_size, truncation=True, max_length=max_length)
+        return [output["score"] for output in outputs]
+
+
+# ======== Бэкенд на ONNX Runtime ========
+def postprocess_logits(logits, config):
+    # Та же функция активации, что выбирает TextClassificationPipeline
+    if config.problem_type == "regression":
+        scores = logits
+    elif config.problem_type == "multi_label_classification" or config.num_labels == 1:
+        scores = 1.0 / (1.0 + np.exp(-logits))
+    else:
+        shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        scores = shifted / shifted.sum(axis=-1, keepdims=True)
+    return scores.max(axis=-1).tolist()
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, onnx_path, tokenizer, config, num_threads=0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        # InferenceSession.run потокобезопасен, поэтому сессия общая для всех потоков
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.onnx_path = onnx_path
+        self.tokenizer = tokenizer
+        self.config = config
+        self.local = threading.local()
+
+    def local_tokenizer(self):
+        tokenizer = getattr(self.local, "tokenizer", None)
+        if tokenizer is None:
+            tokenizer = copy.deepcopy(self.tokenizer)
+            self.local.tokenizer = tokenizer
+        return tokenizer
+
+    def token_lengths(self, texts, max_length):
+        encoding = self.local_tokenizer()(texts, truncation=True, max_length=max_length)
+        return [len(ids) for ids in encoding["input_ids"]]
+
+    def predict(self, texts, batch_size, max_length):
+        scores = []
+        for start in range(0, len(texts), batch_size):
+            encoding = self.local_tokenizer()(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=max_length,
+                return_tensors="np"
+            )
+            logits = self.session.run(
+                ["logits"],
+                {
+                    "input_ids": encoding["input_ids"].astype(np.int64),
+                    "attention_mask": encoding["attention_mask"].astype(np.int64),
+                }
+            )[0]
+            scores.extend(postprocess_logits(logits, self.config))
+        return scores
+
+
+def export_onnx(model, output_path, quantize=False, opset_version=14):
+    try:
+        import torch
+
+        class LogitsOnly(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, input_ids, attention_mask):
+                return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        dummy = torch.ones((1, 8), dtype=torch.long)
+        with torch.no_grad():
+            torch.onnx.export(
+                LogitsOnly(model.eval()),
+                (dummy, dummy),
+                output_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["logits"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "logits": {0: "batch"},
+                },
+                opset_version=opset_version,
+            )
+
+        if not quantize:
+            return output_path
+
+        # Динамическая int8-квантизация весов линейных слоёв
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantized_path = output_path.replace(".onnx", ".int8.onnx")
+        quantize_dynamic(output_path, quantized_path, weight_type=QuantType.QInt8)
+        return quantized_path
+    except Exception as e:
+        print(f"Error in export_onnx: {e}")
+        raise
+
+
+# ======== Выбор бэкенда по конфигурации ========
+EXPORT_NAME_RE = re.compile(r'^model-v\d+(\.int8)?\.onnx$')
+
+
+def remove_stale_exports(onnx_dir, keep_paths):
+    # Сессия ONNX Runtime загружает модель в память при создании, поэтому файлы прошлых версий
+    # можно удалить, как только готов бэкенд новой: иначе каталог растёт с каждым запуском и заменой модели
+    keep = {os.path.abspath(path) for path in keep_paths}
+    for name in os.listdir(onnx_dir):
+        path = os.path.abspath(os.path.join(onnx_dir, name))
+        if EXPORT_NAME_RE.match(name) and path not in keep:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Error in remove_stale_exports: {e}")
+
+
+def make_backend_factory(name="torch", onnx_dir="./onnx_models", quantize=False, num_threads=0):
+    if name not in ("torch", "onnx"):
+        raise ValueError(f"Unknown inference backend '{name}'. Available backends: ['torch', 'onnx']")
+
+    def factory(model, tokenizer, version):
+        if name == "torch":
+            return TorchBackend(model, tokenizer)
+        # Каждая версия модели экспортируется в свой файл, поэтому старый снимок дорабатывает на своём
+        export_path = os.path.join(onnx_dir, f"model-v{version}.onnx")
+        onnx_path = export_onnx(model, export_path, quantize=quantize)
+        backend = OnnxBackend(onnx_path, tokenizer, model.config, num_threads=num_threads)
+        remove_stale_exports(onnx_dir, [export_path, onnx_path])
+        return backend
+
+    return factory
+
+
+if __name__ == "__main__":
+    import argparse
+    from transformers import AutoModelForSequenceClassification
+
+    parser = argparse.ArgumentParser(description="Экспорт модели или чекпоинта (training_results/checkpoint-*) в ONNX")
+    parser.add_argument("model", help="Каталог чекпоинта или имя модели на Hugging Face")
+    parser.add_argument("output", help="Путь к файлу .onnx")
+    parser.add_argument("--quantize", action="store_true", help="Дополнительно сохранить int8-версию")
+    args = parser.parse_args()
+
+    exported = export_onnx(
+        AutoModelForSequenceClassification.from_pretrained(args.model), args.output, quantize=args.quantize
+    )
+    print("Модель сохранена:", exported)
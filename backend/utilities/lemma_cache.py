@@ -0,0 +1,81 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class LemmaCache:
+    # Кэш "словоформа -> лемма" с ограничением размера и вытеснением по LRU
+    def __init__(self, morph, max_size=100000):
+        self.morph = morph
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lemmatize(self, word):
+        if self.max_size <= 0:
+            return self.morph.parse(word)[0].normal_form
+
+        with self.lock:
+            lemma = self.cache.get(word)
+            if lemma is not None:
+                self.cache.move_to_end(word)
+                self.hits += 1
+                return lemma
+            self.misses += 1
+
+        lemma = self.morph.parse(word)[0].normal_form
+        self.put(word, lemma)
+        return lemma
+
+    def put(self, word, lemma):
+        with self.lock:
+            self.cache[word] = lemma
+            self.cache.move_to_end(word)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.cache),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def save(self, path):
+        try:
+            with self.lock:
+                # Сохраняем в порядке LRU, чтобы после загрузки вытеснение шло так же
+                items = list(self.cache.items())
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(items, file, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error in LemmaCache.save: {e}")
+            raise
+
+    def load(self, path):
+        try:
+            if not os.path.exists(path):
+                return 0
+            with open(path, 'r', encoding='utf-8') as file:
+                items = json.load(file)
+            for word, lemma in items[-self.max_size:] if self.max_size > 0 else []:
+                self.put(word, lemma)
+            return len(self.cache)
+        except Exception as e:
+            print(f"Error in LemmaCache.load: {e}")
+            raise
@@ -0,0 +1,119 @@
+import asyncio
+from collections import deque
+
+
+class DynamicBatcher:
+    def __init__(self, classify_batch, max_batch_size=32, max_wait_ms=5, executor=None):
+        self.classify_batch = classify_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+
+        self.pending = deque()
+        self.has_items = None
+        self.is_full = None
+        self.worker = None
+
+        # Метрики
+        self.requests_total = 0
+        self.batches_total = 0
+        self.last_batch_size = 0
+        self.max_batch_size_seen = 0
+        self.batch_size_histogram = {}
+
+    def start(self):
+        if self.worker is None:
+            self.has_items = asyncio.Event()
+            self.is_full = asyncio.Event()
+            self.worker = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+
+        while self.pending:
+            _, future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, text):
+        if self.worker is None:
+            raise RuntimeError("Batcher is not started")
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((text, future))
+        self.requests_total += 1
+        self.has_items.set()
+        if len(self.pending) >= self.max_batch_size:
+            self.is_full.set()
+        return await future
+
+    def take_batch(self):
+        batch = []
+        while self.pending and len(batch) < self.max_batch_size:
+            text, future = self.pending.popleft()
+            # Клиент мог отключиться, пока запрос ждал в очереди
+            if not future.cancelled():
+                batch.append((text, future))
+
+        if not self.pending:
+            self.has_items.clear()
+        if len(self.pending) < self.max_batch_size:
+            self.is_full.clear()
+        return batch
+
+    def record_batch(self, size):
+        self.batches_total += 1
+        self.last_batch_size = size
+        self.max_batch_size_seen = max(self.max_batch_size_seen, size)
+        self.batch_size_histogram[size] = self.batch_size_histogram.get(size, 0) + 1
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.has_items.wait()
+
+            # Ждём остальные запросы окна, но не дольше max_wait и не больше max_batch_size
+            try:
+                await asyncio.wait_for(self.is_full.wait(), timeout=self.max_wait)
+            except asyncio.TimeoutError:
+                pass
+
+            batch = self.take_batch()
+            if not batch:
+                continue
+            self.record_batch(len(batch))
+
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self.classify_batch, [text for text, _ in batch]
+                )
+            except Exception as e:
+                print(f"Error in DynamicBatcher batch: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def metrics(self):
+        batched_requests = sum(size * count for size, count in self.batch_size_histogram.items())
+        return {
+            "queue_depth": len(self.pending),
+            "requests_total": self.requests_total,
+            "batches_total": self.batches_total,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size_seen": self.max_batch_size_seen,
+            "mean_batch_size": batched_requests / self.batches_total if self.batches_total else 0,
+            "batch_size_histogram": self.batch_size_histogram,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
@@ -0,0 +1,41 @@
+import threading
+
+from utilities.inference_backends import TorchBackend
+
+
+def torch_backend_factory(model, tokenizer, version):
+    return TorchBackend(model, tokenizer)
+
+
+class ModelSnapshot:
+    # Неизменяемый снимок модели: после публикации веса не меняются, поэтому читать можно без блокировки
+    def __init__(self, model, tokenizer, version, backend):
+        self.model = model.eval()
+        self.tokenizer = tokenizer
+        self.version = version
+        self.backend = backend
+
+
+class ModelHandle:
+    def __init__(self, model, tokenizer, backend_factory=torch_backend_factory):
+        self.swap_lock = threading.Lock()
+        self.backend_factory = backend_factory
+        self.snapshot = self.make_snapshot(model, tokenizer, version=1)
+
+    def make_snapshot(self, model, tokenizer, version):
+        return ModelSnapshot(model, tokenizer, version, self.backend_factory(model, tokenizer, version))
+
+    def acquire(self):
+        # Чтение ссылки атомарно: запрос работает со снимком, который был актуален на момент старта
+        return self.snapshot
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    def swap(self, model, tokenizer=None):
+        # Эксклюзивна только замена ссылки; запросы в полёте дорабатывают на старом снимке
+        with self.swap_lock:
+            current = self.snapshot
+            self.snapshot = self.make_snapshot(model, tokenizer or current.tokenizer, current.version + 1)
+            return self.snapshot.version
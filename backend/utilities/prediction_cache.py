@@ -0,0 +1,117 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    # Кэш предсказаний по содержимому: ключ - очищенный текст, версия модели и namespace.
+    # Версия модели начинается с 1 при каждом запуске, поэтому namespace (модель, бэкенд инференса,
+    # квантизация) отделяет записи разных конфигураций в SQLite.
+    # В памяти хранится не больше max_size записей (LRU), записи старше ttl секунд считаются устаревшими
+    def __init__(self, max_size=100000, ttl=0, sqlite_path=None, namespace=""):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.namespace = namespace
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.db = None
+        if sqlite_path:
+            self.db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions "
+                "(key TEXT PRIMARY KEY, label TEXT, score REAL, created REAL)"
+            )
+            self.db.commit()
+
+    def make_key(self, text, model_version):
+        return hashlib.sha1(f"{self.namespace}\x00{model_version}\x00{text}".encode("utf-8")).hexdigest()
+
+    def is_expired(self, created, now):
+        return self.ttl > 0 and now - created > self.ttl
+
+    def get_many(self, texts, model_version):
+        if self.max_size <= 0:
+            return {}
+
+        now = time.time()
+        found = {}
+        missing = {}
+        with self.lock:
+            for text in texts:
+                key = self.make_key(text, model_version)
+                entry = self.cache.get(key)
+                if entry is not None and not self.is_expired(entry[1], now):
+                    self.cache.move_to_end(key)
+                    found[text] = entry[0]
+                else:
+                    missing[key] = text
+
+            if missing and self.db is not None:
+                keys = list(missing)
+                # Ограничение SQLite на число параметров в одном запросе
+                for start in range(0, len(keys), 500):
+                    part = keys[start:start + 500]
+                    rows = self.db.execute(
+                        f"SELECT key, label, score, created FROM predictions "
+                        f"WHERE key IN ({','.join('?' * len(part))})",
+                        part
+                    ).fetchall()
+                    for key, label, score, created in rows:
+                        if self.is_expired(created, now):
+                            continue
+                        result = {"label": label, "score": score}
+                        self.store(key, result, created)
+                        found[missing[key]] = result
+
+            self.hits += len(found)
+            self.misses += len(texts) - len(found)
+        return found
+
+    def store(self, key, result, created):
+        self.cache[key] = (result, created)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    def put_many(self, results, model_version):
+        if self.max_size <= 0 or not results:
+            return
+
+        now = time.time()
+        rows = []
+        with self.lock:
+            for text, result in results.items():
+                key = self.make_key(text, model_version)
+                self.store(key, result, now)
+                rows.append((key, result["label"], result["score"], now))
+
+            if self.db is not None:
+                self.db.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)", rows)
+                self.db.commit()
+
+    def clear(self):
+        # Вызывается при замене модели: предсказания старой версии больше не нужны
+        with self.lock:
+            self.cache.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM predictions")
+                self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.cache),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "persistent": self.db is not None,
+                "namespace": self.namespace,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,56 @@
+import os
+import threading
+from pymorphy3 import MorphAnalyzer
+from nltk.corpus import stopwords
+from nltk.tokenize import word_tokenize
+from natasha import NamesExtractor, MorphVocab
+
+from utilities.lemma_cache import LemmaCache
+
+
+KEEP_WORDS = frozenset({
+    'не', 'ни', 'нет', 'без', 'никак', 'вовсе', 'отнюдь',  # Отрицания
+    'очень', 'совсем', 'абсолютно', 'совершенно', 'крайне',  # Интенсификаторы
+    'ли', 'ведь', 'либо', 'даже',  # Модальные частицы
+    'хорошо', 'плохо', 'ужасно', 'прекрасно'  # Оценочные прилагательные
+})
+
+WARM_UP_TEXT = "Иван Петрович сказал, что погода сегодня очень хорошая, но завтра будет дождь."
+
+
+def build_stopwords(language='russian'):
+    return frozenset(set(stopwords.words(language)) - KEEP_WORDS)
+
+
+class PreprocessingResources:
+    # Тяжёлые ресурсы предобработки: загружаются один раз и дальше используются только на чтение
+    def __init__(self, language='russian', lemma_cache_size=100000):
+        self.language = language
+        self.morph = MorphAnalyzer(lang='ru')
+        self.names_extractor = NamesExtractor(MorphVocab())
+        self.stopwords = build_stopwords(language)
+        self.lemma_cache = LemmaCache(self.morph, max_size=lemma_cache_size)
+
+    def warm_up(self):
+        try:
+            list(self.names_extractor(WARM_UP_TEXT))
+            for word in word_tokenize(WARM_UP_TEXT.lower(), language=self.language):
+                self.morph.parse(word)
+        except Exception as e:
+            print(f"Error in warm_up: {e}")
+            raise
+
+
+_resources = None
+_resources_lock = threading.Lock()
+
+
+def get_resources():
+    global _resources
+    if _resources is None:
+        with _resources_lock:
+            if _resources is None:
+                _resources = PreprocessingResources(
+                    lemma_cache_size=int(os.environ.get("LEMMA_CACHE_SIZE", 100000))
+                )
+    return _resources
@@ -0,0 +1,69 @@
+import heapq
+from collections import Counter
+
+
+class TopKCounter:
+    # Приближённый подсчёт частых токенов в ограниченной памяти по схеме Space-Saving:
+    # хранится не больше capacity счётчиков, при переполнении редкие отбрасываются.
+    # Новый токен начинает со счёта error (наибольший отброшенный счёт), поэтому часто
+    # встречающийся токен не теряется, а его счёт завышен не больше чем на error
+    def __init__(self, top_k=200, capacity=None):
+        self.top_k = top_k
+        self.capacity = capacity or top_k * 10
+        self.counts = Counter()
+        self.error = 0
+
+    def update(self, tokens):
+        for token, count in Counter(tokens).items():
+            if token in self.counts:
+                self.counts[token] += count
+            else:
+                self.counts[token] = self.error + count
+        if len(self.counts) > self.capacity:
+            self.prune()
+
+    def prune(self):
+        kept = heapq.nlargest(self.capacity + 1, self.counts.items(), key=lambda item: item[1])
+        # Самый частый из отброшенных токенов
+        self.error = max(self.error, kept[-1][1])
+        self.counts = Counter(dict(kept[:self.capacity]))
+
+    def most_common(self):
+        return dict(self.counts.most_common(self.top_k))
+
+    def state(self):
+        return {"counts": dict(self.counts), "error": self.error}
+
+    def restore(self, state):
+        self.counts = Counter(state["counts"])
+        self.error = state["error"]
+
+
+class LabelTokenFrequencies:
+    # Частоты токенов очищенных текстов отдельно для каждой метки, накапливаются по мере инференса
+    def __init__(self, top_k=200, capacity=None):
+        self.top_k = top_k
+        self.capacity = capacity
+        self.counters = {}
+
+    def update(self, labels, texts):
+        tokens_by_label = {}
+        for label, text in zip(labels, texts):
+            tokens_by_label.setdefault(label, []).extend(text.split())
+        for label, tokens in tokens_by_label.items():
+            counter = self.counters.get(label)
+            if counter is None:
+                counter = self.counters[label] = TopKCounter(self.top_k, self.capacity)
+            counter.update(tokens)
+
+    def to_dict(self):
+        return {label: counter.most_common() for label, counter in self.counters.items()}
+
+    def state(self):
+        # Полное состояние счётчиков: по нему подсчёт продолжается на следующей порции данных
+        return {label: counter.state() for label, counter in self.counters.items()}
+
+    def restore(self, state):
+        for label, counter_state in state.items():
+            counter = self.counters[label] = TopKCounter(self.top_k, self.capacity)
+            counter.restore(counter_state)
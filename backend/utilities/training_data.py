@@ -0,0 +1,145 @@
+import hashlib
+import os
+import time
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+
+class SentimentDataset(Dataset):
+    # Исходный вариант: токенизация на каждом обращении и паддинг до max_length
+    def __init__(self, texts, labels, tokenizer, max_length=512):
+        self.texts = texts
+        self.labels = labels
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __getitem__(self, idx):
+        text = self.texts[idx]
+        label = self.labels[idx]
+        encoding = self.tokenizer(
+            text,
+            padding="max_length",
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="pt"
+        )
+        return {
+            "input_ids": encoding["input_ids"].squeeze(),
+            "attention_mask": encoding["attention_mask"].squeeze(),
+            "labels": torch.tensor(label, dtype=torch.float32)
+        }
+
+
+class TokenizedDataset(Dataset):
+    # Датасет, токенизированный заранее: все id лежат в одном массиве, границы примеров - в offsets.
+    # Паддинг добавляет коллатор отдельно для каждого батча
+    def __init__(self, input_ids, offsets, labels):
+        self.input_ids = input_ids
+        self.offsets = offsets
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        ids = self.input_ids[self.offsets[idx]:self.offsets[idx + 1]].tolist()
+        return {
+            "input_ids": ids,
+            "attention_mask": [1] * len(ids),
+            "labels": float(self.labels[idx])
+        }
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+
+def tokenizer_fingerprint(tokenizer):
+    # Путь токенизатора у каждого задания обучения свой (training_jobs/<id>/source_model),
+    # поэтому ключ строится по содержимому: класс, словарь и специальные токены
+    digest = hashlib.sha256()
+    digest.update(f"{type(tokenizer).__name__}|{tokenizer.init_kwargs.get('do_lower_case')}".encode("utf-8"))
+    for token, index in sorted(tokenizer.get_vocab().items(), key=lambda item: item[1]):
+        digest.update(f"{index}\x00{token}\x01".encode("utf-8"))
+    digest.update("|".join(tokenizer.all_special_tokens).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def dataset_cache_key(texts, labels, tokenizer, max_length):
+    digest = hashlib.sha256()
+    digest.update(f"{tokenizer_fingerprint(tokenizer)}|{max_length}".encode("utf-8"))
+    for text, label in zip(texts, labels):
+        digest.update(str(text).encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(str(label).encode("utf-8"))
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+def prune_cache(cache_dir, max_size=0, max_age=0):
+    # Удаляет файлы старше max_age секунд, затем самые давно использованные, пока кэш больше max_size байт.
+    # 0 - без ограничения
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".npz") or ".tmp" in name:
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    now = time.time()
+    entries.sort()
+    total_size = sum(size for _, size, _ in entries)
+    for mtime, size, path in entries:
+        expired = max_age > 0 and now - mtime > max_age
+        oversized = max_size > 0 and total_size > max_size
+        if not expired and not oversized:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+
+def tokenize_dataset(texts, labels, tokenizer, max_length=512, cache_dir=None, batch_size=1000,
+                     cache_max_size=0, cache_max_age=0):
+    try:
+        cache_path = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            cache_path = os.path.join(cache_dir, f"{dataset_cache_key(texts, labels, tokenizer, max_length)}.npz")
+            if os.path.exists(cache_path):
+                # Время изменения - время последнего использования: по нему вытесняются старые файлы
+                os.utime(cache_path)
+                cached = np.load(cache_path)
+                return TokenizedDataset(cached["input_ids"], cached["offsets"], cached["labels"])
+
+        # Токенизируем весь датасет один раз, пакетами и без паддинга
+        encoded = []
+        for start in range(0, len(texts), batch_size):
+            batch = [str(text) for text in texts[start:start + batch_size]]
+            encoded.extend(tokenizer(batch, truncation=True, max_length=max_length)["input_ids"])
+
+        lengths = np.fromiter((len(ids) for ids in encoded), dtype=np.int64, count=len(encoded))
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        input_ids = np.fromiter((i for ids in encoded for i in ids), dtype=np.int32, count=int(offsets[-1]))
+        labels = np.asarray(labels, dtype=np.float32)
+
+        if cache_path:
+            tmp_path = f"{cache_path}.tmp.npz"
+            np.savez(tmp_path, input_ids=input_ids, offsets=offsets, labels=labels)
+            os.replace(tmp_path, cache_path)
+            prune_cache(cache_dir, cache_max_size, cache_max_age)
+
+        return TokenizedDataset(input_ids, offsets, labels)
+    except Exception as e:
+        print(f"Error in tokenize_dataset: {e}")
+        raise
@@ -0,0 +1,291 @@
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+# ======== Код рабочего процесса обучения ========
+def make_progress_callback(progress_queue, cancel_event):
+    from transformers import TrainerCallback
+
+    class ProgressCallback(TrainerCallback):
+        # Передаёт шаг, эпоху, loss и скорость обучения в основной процесс и проверяет запрос на отмену
+        def __init__(self):
+            self.start_time = None
+            self.epoch_start_time = None
+            self.epoch_times = []
+            self.loss = None
+
+        def on_train_begin(self, args, state, control, **kwargs):
+            self.start_time = time.time()
+            progress_queue.put({"status": "running", "step": 0, "max_steps": state.max_steps})
+
+        def on_epoch_begin(self, args, state, control, **kwargs):
+            self.epoch_start_time = time.time()
+
+        def on_epoch_end(self, args, state, control, **kwargs):
+            self.epoch_times.append(time.time() - self.epoch_start_time)
+            progress_queue.put({"epoch_times": list(self.epoch_times)})
+
+        def on_log(self, args, state, control, logs=None, **kwargs):
+            if logs and "loss" in logs:
+                self.loss = logs["loss"]
+
+        def on_step_end(self, args, state, control, **kwargs):
+            elapsed = max(time.time() - self.start_time, 1e-9)
+            samples = (
+                state.global_step * args.per_device_train_batch_size
+                * args.gradient_accumulation_steps * max(args.world_size, 1)
+            )
+            progress_queue.put({
+                "step": state.global_step,
+                "max_steps": state.max_steps,
+                "epoch": state.epoch,
+                "loss": self.loss,
+                "samples_per_second": samples / elapsed,
+                "progress": state.global_step / state.max_steps if state.max_steps else 0,
+            })
+            if cancel_event.is_set():
+                control.should_training_stop = True
+
+    return ProgressCallback()
+
+
+def run_training_job(job_dir, settings, progress_queue, cancel_event):
+    try:
+        # Обучение не должно отнимать процессор у инференса в основном процессе
+        os.nice(settings["niceness"])
+
+        import pandas as pd
+        import torch
+        from transformers import (
+            AutoModelForSequenceClassification, AutoTokenizer, DataCollatorWithPadding,
+            TrainingArguments, Trainer
+        )
+        from utilities.training_data import SentimentDataset, tokenize_dataset
+
+        torch.set_num_threads(settings["num_threads"])
+
+        source_dir = os.path.join(job_dir, "source_model")
+        model = AutoModelForSequenceClassification.from_pretrained(source_dir)
+        tokenizer = AutoTokenizer.from_pretrained(source_dir)
+
+        data = pd.read_pickle(os.path.join(job_dir, "data.pkl"))
+        data["score"] = data["Class"].map({'N': 0, "G": 1, "B": -1})
+
+        texts = data["MessageText"].tolist()
+        labels = data["score"].tolist()
+        if settings["dynamic_padding"]:
+            # Один проход токенизации с кэшем на диске и паддинг до самого длинного примера в батче
+            train_dataset = tokenize_dataset(
+                texts, labels, tokenizer, cache_dir=settings["cache_dir"],
+                cache_max_size=settings["cache_max_size"], cache_max_age=settings["cache_max_age"]
+            )
+            data_collator = DataCollatorWithPadding(tokenizer)
+        else:
+            train_dataset = SentimentDataset(texts=texts, labels=labels, tokenizer=tokenizer)
+            data_collator = None
+
+        training_args = TrainingArguments(
+            output_dir=settings["output_dir"],
+            learning_rate=3e-6,
+            num_train_epochs=3,
+            per_device_train_batch_size=3,
+            logging_steps=settings["logging_steps"],
+            group_by_length=settings["dynamic_padding"] and settings["group_by_length"],
+        )
+
+        trainer = Trainer(
+            model=model,
+            args=training_args,
+            train_dataset=train_dataset,
+            data_collator=data_collator,
+            callbacks=[make_progress_callback(progress_queue, cancel_event)],
+        )
+
+        if cancel_event.is_set():
+            progress_queue.put({"status": "cancelled"})
+            return
+
+        trainer.train()
+
+        if cancel_event.is_set():
+            progress_queue.put({"status": "cancelled"})
+            return
+
+        trained_dir = os.path.join(job_dir, "trained_model")
+        model.save_pretrained(trained_dir)
+        tokenizer.save_pretrained(trained_dir)
+        progress_queue.put({"status": "trained", "trained_dir": trained_dir})
+    except Exception as e:
+        progress_queue.put({"status": "failed", "error": f"Ошибка обучения: {e}"})
+
+
+# ======== Менеджер заданий в основном процессе ========
+class TrainingJobManager:
+    def __init__(self, model_handle, work_dir="./training_jobs", output_dir="./training_results",
+                 num_threads=1, niceness=10, logging_steps=10, dynamic_padding=True,
+                 group_by_length=True, cache_dir="./training_cache", cache_max_size=0, cache_max_age=0,
+                 on_model_swapped=None):
+        self.model_handle = model_handle
+        self.work_dir = work_dir
+        self.output_dir = output_dir
+        self.num_threads = num_threads
+        self.niceness = niceness
+        self.logging_steps = logging_steps
+        self.dynamic_padding = dynamic_padding
+        self.group_by_length = group_by_length
+        self.cache_dir = cache_dir
+        self.cache_max_size = cache_max_size
+        self.cache_max_age = cache_max_age
+        self.on_model_swapped = on_model_swapped
+
+        # spawn: рабочий процесс не наследует потоки и состояние torch основного процесса
+        self.context = multiprocessing.get_context("spawn")
+        self.jobs = {}
+        self.latest_job_id = None
+        self.lock = threading.Lock()
+        self.submit_lock = threading.Lock()
+
+    def is_busy(self):
+        with self.lock:
+            return any(job["status"] not in TERMINAL_STATUSES for job in self.jobs.values())
+
+    def submit(self, data):
+        with self.submit_lock:
+            if self.is_busy():
+                raise RuntimeError("Обучение уже выполняется")
+            return self.start_job(data)
+
+    def start_job(self, data):
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.work_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+
+        try:
+            # Рабочий процесс обучает собственную копию текущего снимка модели
+            snapshot = self.model_handle.acquire()
+            source_dir = os.path.join(job_dir, "source_model")
+            snapshot.model.save_pretrained(source_dir)
+            snapshot.tokenizer.save_pretrained(source_dir)
+            data.to_pickle(os.path.join(job_dir, "data.pkl"))
+
+            progress_queue = self.context.Queue()
+            cancel_event = self.context.Event()
+            settings = {
+                "output_dir": os.path.join(self.output_dir, job_id),
+                "num_threads": self.num_threads,
+                "niceness": self.niceness,
+                "logging_steps": self.logging_steps,
+                "dynamic_padding": self.dynamic_padding,
+                "group_by_length": self.group_by_length,
+                "cache_dir": self.cache_dir,
+                "cache_max_size": self.cache_max_size,
+                "cache_max_age": self.cache_max_age,
+            }
+            process = self.context.Process(
+                target=run_training_job,
+                args=(job_dir, settings, progress_queue, cancel_event),
+                daemon=True
+            )
+
+            job = {
+                "job_id": job_id,
+                "status": "starting",
+                "progress": 0,
+                "step": 0,
+                "max_steps": None,
+                "epoch": 0,
+                "loss": None,
+                "samples_per_second": None,
+                "epoch_times": [],
+                "base_model_version": snapshot.version,
+                "model_version": None,
+                "error": None,
+                "started_at": time.time(),
+                "finished_at": None,
+            }
+            with self.lock:
+                self.jobs[job_id] = {**job, "cancel_event": cancel_event}
+                self.latest_job_id = job_id
+
+            process.start()
+            threading.Thread(
+                target=self.monitor, args=(job_id, job_dir, process, progress_queue), daemon=True
+            ).start()
+            return job_id
+        except Exception:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+    def update(self, job_id, **fields):
+        with self.lock:
+            self.jobs[job_id].update(fields)
+
+    def monitor(self, job_id, job_dir, process, progress_queue):
+        try:
+            while True:
+                try:
+                    message = progress_queue.get(timeout=1)
+                except queue.Empty:
+                    if not process.is_alive():
+                        self.update(job_id, status="failed", error="Процесс обучения неожиданно завершился")
+                        break
+                    continue
+
+                status = message.get("status")
+                if status == "trained":
+                    self.swap_model(job_id, message["trained_dir"])
+                    break
+                if status in ("failed", "cancelled"):
+                    self.update(job_id, **message)
+                    break
+
+                if self.status(job_id)["status"] == "cancelling":
+                    message.pop("status", None)
+                self.update(job_id, **message)
+        except Exception as e:
+            print(f"Error in TrainingJobManager.monitor: {e}")
+            self.update(job_id, status="failed", error=str(e))
+        finally:
+            process.join(timeout=30)
+            self.update(job_id, finished_at=time.time())
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    def swap_model(self, job_id, trained_dir):
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        # Веса подменяются только после успешного обучения
+        model = AutoModelForSequenceClassification.from_pretrained(trained_dir)
+        tokenizer = AutoTokenizer.from_pretrained(trained_dir)
+        version = self.model_handle.swap(model, tokenizer)
+        if self.on_model_swapped is not None:
+            self.on_model_swapped(version)
+        self.update(job_id, status="completed", progress=1, model_version=version)
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            if job["status"] not in TERMINAL_STATUSES:
+                job["cancel_event"].set()
+                job["status"] = "cancelling"
+
+    def status(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            return {key: value for key, value in job.items() if key != "cancel_event"}
+
+    def latest_status(self):
+        if self.latest_job_id is None:
+            return {"status": "idle", "progress": 0}
+        return self.status(self.latest_job_id)
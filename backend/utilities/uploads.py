@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+
+class UploadOffsetError(Exception):
+    # Клиент прислал часть не с того смещения: он должен продолжить с offset, подтверждённого сервером
+    def __init__(self, offset):
+        super().__init__(f"Ожидалось смещение {offset}")
+        self.offset = offset
+
+
+class UploadStore:
+    # Загрузка по частям: каждая часть дописывается в файл на диске, метаданные лежат рядом в JSON,
+    # поэтому прерванную загрузку можно продолжить и после перезапуска сервера
+    def __init__(self, directory="./uploads", max_size=0, ttl=24 * 3600):
+        self.directory = directory
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def spool_path(self, upload_id):
+        return os.path.join(self.directory, f"{upload_id}.part")
+
+    def meta_path(self, upload_id):
+        return os.path.join(self.directory, f"{upload_id}.json")
+
+    def read_meta(self, upload_id):
+        # upload_id приходит от клиента: принимаем только то, что сами выдали
+        if len(upload_id) != 32 or not all(c in "0123456789abcdef" for c in upload_id):
+            raise KeyError(upload_id)
+        try:
+            with open(self.meta_path(upload_id), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            raise KeyError(upload_id)
+
+    def write_meta(self, meta):
+        tmp_path = f"{self.meta_path(meta['upload_id'])}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(meta, file, ensure_ascii=False)
+        os.replace(tmp_path, self.meta_path(meta["upload_id"]))
+
+    def create(self, filename, total_size):
+        if total_size < 0:
+            raise ValueError("Размер файла не может быть отрицательным")
+        if self.max_size and total_size > self.max_size:
+            raise ValueError(f"Файл больше допустимого размера {self.max_size} байт")
+
+        self.cleanup_expired()
+        now = time.time()
+        meta = {
+            "upload_id": uuid.uuid4().hex,
+            "filename": filename,
+            "offset": 0,
+            "total_size": total_size,
+            "complete": total_size == 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self.lock:
+            open(self.spool_path(meta["upload_id"]), "wb").close()
+            self.write_meta(meta)
+        return meta
+
+    def create_from_file(self, filename, source):
+        # Обычная загрузка через форму тоже сохраняется на диск, чтобы фоновое задание могло её прочитать
+        meta = self.create(filename, 0)
+        with open(self.spool_path(meta["upload_id"]), "wb") as file:
+            shutil.copyfileobj(source, file, 1024 * 1024)
+            size = file.tell()
+        if self.max_size and size > self.max_size:
+            self.delete(meta["upload_id"])
+            raise ValueError(f"Файл больше допустимого размера {self.max_size} байт")
+        with self.lock:
+            meta.update(offset=size, total_size=size, complete=True, updated_at=time.time())
+            self.write_meta(meta)
+        return meta
+
+    def append(self, upload_id, offset, data):
+        with self.lock:
+            meta = self.read_meta(upload_id)
+            if offset != meta["offset"]:
+                raise UploadOffsetError(meta["offset"])
+            new_offset = offset + len(data)
+            if new_offset > meta["total_size"]:
+                raise ValueError("Часть выходит за объявленный размер файла")
+
+            # Обрезка до подтверждённого смещения убирает хвост части, прерванной на середине записи
+            with open(self.spool_path(upload_id), "r+b") as file:
+                file.truncate(offset)
+                file.seek(offset)
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+
+            meta["offset"] = new_offset
+            meta["complete"] = new_offset == meta["total_size"]
+            meta["updated_at"] = time.time()
+            self.write_meta(meta)
+            return meta
+
+    def status(self, upload_id):
+        with self.lock:
+            return self.read_meta(upload_id)
+
+    def open(self, upload_id):
+        # Анализ читает файл потоково, а не строкой в памяти
+        meta = self.status(upload_id)
+        if not meta["complete"]:
+            raise ValueError(f"Загрузка {upload_id} не завершена: получено {meta['offset']} байт")
+        return open(self.spool_path(upload_id), "rb")
+
+    def delete(self, upload_id):
+        with self.lock:
+            self.read_meta(upload_id)
+            for path in (self.spool_path(upload_id), self.meta_path(upload_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def cleanup_expired(self):
+        if self.ttl <= 0:
+            return
+        now = time.time()
+        with self.lock:
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                upload_id = name[:-len(".json")]
+                try:
+                    meta = self.read_meta(upload_id)
+                except (KeyError, ValueError):
+                    continue
+                if now - meta["updated_at"] > self.ttl:
+                    for path in (self.spool_path(upload_id), self.meta_path(upload_id)):
+                        if os.path.exists(path):
+                            os.remove(path)
@@ -1,18 +1,17 @@
 import streamlit as st
 import os
-import base64
 # Импортируем домашнюю страницу
 from homepage import show_homepage
 # Импортируем ваши модули функционала (предполагается, что они находятся в папке utilities)
 from utilities import sentiment_analysis, data_preprocessing, training, chat_analysis, csv_analysis
+from utilities.caching import load_image_base64
 
 def show_functional_page():
     st.title("Анализ тональности текстовых данных")
     st.write(
         "Добро пожаловать, выберите один из предложенных режимов и начните свою работу")
 
-    with open("SentimentPanda.png", "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode()
+    encoded_string = load_image_base64("SentimentPanda.png")
 
     with st.sidebar:
         st.markdown(
@@ -0,0 +1,91 @@
+import io
+import time
+import pandas as pd
+import requests
+import streamlit as st
+
+from utilities.api_client import get_session
+
+
+# Файлы больше этого размера анализируются фоновым заданием, а не одним долгим запросом
+BACKGROUND_JOB_MIN_SIZE = 20 * 1024 * 1024
+POLL_INTERVAL = 2
+JOB_TIMEOUT = 6 * 3600
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "оценка времени..."
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"осталось ~{minutes} мин {seconds} с"
+
+
+def wait_for_job(backend_url, data, poll_interval=POLL_INTERVAL, timeout=JOB_TIMEOUT):
+    # Отправляет задание в очередь бэкенда и опрашивает статус до завершения; возвращает статус задания
+    response = get_session().post(f"{backend_url}/jobs/", data=data, timeout=30)
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+
+    progress = st.progress(0.0, text="Задание в очереди...")
+    deadline = time.time() + timeout
+    try:
+        while True:
+            if time.time() > deadline:
+                get_session().post(f"{backend_url}/jobs/{job_id}/cancel", timeout=10)
+                raise TimeoutError(f"Задание {job_id} не завершилось за {timeout} с")
+
+            time.sleep(poll_interval)
+            try:
+                response = get_session().get(f"{backend_url}/jobs/{job_id}", timeout=10)
+                response.raise_for_status()
+            except (requests.ConnectionError, requests.Timeout):
+                # Временная недоступность бэкенда не прерывает ожидание: задание продолжает выполняться
+                continue
+            job = response.json()
+
+            if job["status"] == "failed":
+                raise RuntimeError(job["error"])
+            if job["status"] == "cancelled":
+                raise RuntimeError("Задание отменено")
+            if job["status"] == "completed":
+                return job
+
+            if job["status"] == "queued":
+                progress.progress(0.0, text=f"Задание в очереди (в очереди заданий: {job['queued']})")
+            elif job["rows_total"]:
+                progress.progress(
+                    min(job["rows_done"] / job["rows_total"], 1.0),
+                    text=f"Обработано строк: {job['rows_done']} из {job['rows_total']}, {format_eta(job['eta'])}"
+                )
+            else:
+                progress.progress(0.0, text="Идет предобработка...")
+    finally:
+        progress.empty()
+
+
+def run_analysis_job(backend_url, data, poll_interval=POLL_INTERVAL, timeout=JOB_TIMEOUT):
+    # Дожидается задания и скачивает результат в Parquet.
+    # Возвращает строки и сводку задания (частоты токенов по меткам)
+    job = wait_for_job(backend_url, data, poll_interval, timeout)
+    response = get_session().get(f"{backend_url}/jobs/{job['job_id']}/result", timeout=(10, 300))
+    response.raise_for_status()
+    return pd.read_parquet(io.BytesIO(response.content)), job.get("summary") or {}
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def fetch_job_rows(backend_url, job_id, offset, limit):
+    # Страница строк результата: результат задания неизменен, поэтому страницы кэшируются
+    response = get_session().get(
+        f"{backend_url}/jobs/{job_id}/rows", params={"offset": offset, "limit": limit}, timeout=30
+    )
+    response.raise_for_status()
+    page = response.json()
+    return pd.DataFrame(page["rows"]), page["rows_total"]
+
+
+def fetch_job_csv(backend_url, job_id):
+    response = get_session().get(
+        f"{backend_url}/jobs/{job_id}/result", params={"format": "csv"}, timeout=(10, 300)
+    )
+    response.raise_for_status()
+    return response.content
@@ -0,0 +1,26 @@
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+RETRIES = 3
+POOL_SIZE = 10
+
+
+@st.cache_resource
+def get_session():
+    # Одна сессия на процесс Streamlit: соединения с бэкендом переиспользуются (keep-alive).
+    # Повторяются ошибки соединения и 502/503/504; POST повторяется только при ошибке соединения,
+    # когда запрос ещё не дошёл до бэкенда
+    retry = Retry(
+        total=RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
@@ -0,0 +1,60 @@
+import base64
+import hashlib
+import streamlit as st
+
+from utilities.csv_schema import SAMPLE_SIZE, sniff_csv
+
+
+MAX_CACHED_SCHEMAS = 16
+# Размер порции при потоковом хэшировании загруженного файла
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@st.cache_data(show_spinner=False)
+def load_image_base64(path):
+    with open(path, "rb") as image_file:
+        return base64.b64encode(image_file.read()).decode()
+
+
+def file_hash(uploaded_file):
+    # Хэш всего содержимого, прочитанного порциями: правка в середине файла меняет ключ кэша.
+    # Это быстрее самого анализа, а считается один раз на загрузку и запоминается в сессии
+    hashes = st.session_state.setdefault("file_hashes", {})
+    key = getattr(uploaded_file, "file_id", None) or (uploaded_file.name, uploaded_file.size)
+    if key not in hashes:
+        if len(hashes) >= MAX_CACHED_SCHEMAS:
+            hashes.clear()
+        digest = hashlib.sha1()
+        uploaded_file.seek(0)
+        for chunk in iter(lambda: uploaded_file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        uploaded_file.seek(0)
+        hashes[key] = digest.hexdigest()
+    return hashes[key]
+
+
+@st.cache_data(max_entries=MAX_CACHED_SCHEMAS, show_spinner=False)
+def sniff_csv_cached(content_hash, _uploaded_file):
+    # Аргументы с подчёркиванием не хэшируются: ключ кэша - отпечаток содержимого файла
+    _uploaded_file.seek(0)
+    try:
+        return sniff_csv(_uploaded_file.read(SAMPLE_SIZE))
+    finally:
+        _uploaded_file.seek(0)
+
+
+def sniff_uploaded_csv(uploaded_file):
+    # Разделитель, кодировка и столбцы по первым килобайтам файла; полный разбор делает бэкенд
+    return sniff_csv_cached(file_hash(uploaded_file), uploaded_file)
+
+
+def save_result(page, key, value):
+    # На страницу хранится один последний результат: графики перерисовываются из сессии без запросов к бэкенду
+    st.session_state.setdefault("analysis_results", {})[page] = {"key": key, "value": value}
+
+
+def get_result(page, key):
+    entry = st.session_state.get("analysis_results", {}).get(page)
+    if entry is None or entry["key"] != key:
+        return None
+    return entry["value"]
@@ -2,66 +2,131 @@ import streamlit as st
 import requests
 import plotly.express as px
 import pandas as pd
-import io
 
+from utilities.analysis_jobs import fetch_job_csv, fetch_job_rows, wait_for_job
+from utilities.caching import file_hash, get_result, save_result
+from utilities.chunked_upload import upload_file
 
-def chat_analysis(backend_url):
-    st.sidebar.header("Настройки анализа чатов")
-    uploaded_file = st.sidebar.file_uploader("Загрузите HTML файл", type="html")
-    analyze_button = st.sidebar.button("Анализировать чат")
 
-    # Инициализируем df как None (будет присвоено значение, если анализ выполнится успешно)
-    df = None
+LABEL_NAMES = {
+    "LABEL_0": "Neutral",
+    "LABEL_1": "Positive",
+    "LABEL_2": "Negative"
+}
+PAGE_SIZE = 100
+TOP_SENDERS = 20
+
+
+def analyze_chat(backend_url, uploaded_file, chat_id):
+    # Анализ идёт фоновым заданием: бэкенд хранит размеченные сообщения и отдаёт готовые агрегаты,
+    # клиенту не нужно загружать весь чат, чтобы построить графики
+    data = {"kind": "chat", "upload_id": upload_file(backend_url, uploaded_file)}
+    if chat_id:
+        data["chat_id"] = chat_id
+    job = wait_for_job(backend_url, data)
+    return {"job_id": job["job_id"], "aggregates": job["summary"]["aggregates"]}
+
+
+def aggregates_frame(records, key_name):
+    # Записи вида {"key", "counts", "total", "mean_score"} -> таблица со столбцом на каждую метку
+    df = pd.DataFrame([
+        {key_name: record["key"], "total": record["total"], "mean_score": record["mean_score"],
+         **{LABEL_NAMES.get(label, label): count for label, count in record["counts"].items()}}
+        for record in records
+    ])
+    return df.fillna({column: 0 for column in df.columns if column not in (key_name, "mean_score")})
+
+
+def label_columns(df, key_name):
+    return [column for column in df.columns if column not in (key_name, "total", "mean_score")]
 
-    if analyze_button:
-        if uploaded_file is not None:
-            with st.spinner("Идет анализ..."):
-                try:
-                    files = {"file": (uploaded_file.name, uploaded_file, "text/html")}
-                    response = requests.post(f"{backend_url}/chat_analysis/", files=files)
-                    data = response.json()
 
-                    if isinstance(data, dict):
-                        data = [data]
+def show_chat_results(backend_url, result):
+    aggregates = result["aggregates"]
 
-                    mapping = {
-                        "LABEL_0": "Neutral",
-                        "LABEL_1": "Positive",
-                        "LABEL_2": "Negative"
-                    }
+    st.subheader("Распределение предсказанных меток")
+    labels = pd.DataFrame({
+        "label": [LABEL_NAMES.get(label, label) for label in aggregates["labels"]],
+        "count": list(aggregates["labels"].values()),
+    })
+    st.plotly_chart(px.bar(labels, x="label", y="count", title="Распределение меток"))
 
-                    df = pd.DataFrame(data)
-                    df["label"] = df["label"].map(mapping).fillna(df["label"])
-                    df['datetime'] = pd.to_datetime(
-                        df['Date'] + ' ' + df['Time'],
-                        format='%d.%m.%Y %H:%M'
-                    )
+    if aggregates["by_day"]:
+        st.subheader("Тональность по дням")
+        by_day = aggregates_frame(aggregates["by_day"], "day")
+        st.plotly_chart(px.area(by_day, x="day", y=label_columns(by_day, "day"), title="Сообщения по дням"))
+        st.plotly_chart(px.line(by_day, x="day", y="mean_score", title="Средний score по дням"))
 
-                    st.subheader("Полученный DataFrame")
-                    df_filtered = df.drop(columns=["datetime"], errors="ignore")
-                    st.dataframe(df_filtered.tail())
+    if aggregates["by_hour"]:
+        st.subheader("Тональность по часам")
+        by_hour = aggregates_frame(aggregates["by_hour"], "hour")
+        st.plotly_chart(px.bar(by_hour, x="hour", y=label_columns(by_hour, "hour"), title="Сообщения по часам"))
 
-                    st.subheader("Распределение предсказанных меток")
-                    fig1 = px.histogram(df, x="label", title="Распределение меток")
-                    st.plotly_chart(fig1)
+    if aggregates["by_sender"]:
+        st.subheader("Тональность по отправителям")
+        by_sender = aggregates_frame(aggregates["by_sender"], "sender")
+        st.dataframe(by_sender.sort_values("total", ascending=False).head(TOP_SENDERS), hide_index=True)
 
-                    # Дополнительные графики можно добавить здесь
+    # Сообщения подгружаются постранично по запросу, а не всем чатом сразу
+    st.subheader("Сообщения")
+    pages = max((aggregates["rows_total"] - 1) // PAGE_SIZE + 1, 1)
+    page = st.number_input("Страница", min_value=1, max_value=pages, value=pages)
+    rows, _ = fetch_job_rows(backend_url, result["job_id"], (page - 1) * PAGE_SIZE, PAGE_SIZE)
+    if not rows.empty:
+        rows["label"] = rows["label"].map(LABEL_NAMES).fillna(rows["label"])
+    st.dataframe(rows)
 
+
+def chat_analysis(backend_url):
+    st.sidebar.header("Настройки анализа чатов")
+    uploaded_file = st.sidebar.file_uploader(
+        "Загрузите HTML файл или zip-архив экспорта", type=["html", "zip"]
+    )
+    chat_id = st.sidebar.text_input(
+        "Идентификатор чата (необязательно)",
+        help="Если указан, сохранённые результаты переиспользуются и анализируются только новые сообщения"
+    ).strip()
+    analyze_button = st.sidebar.button("Анализировать чат")
+
+    # Результат привязан к содержимому файла и chat_id: при смене виджетов он берётся из сессии
+    result_key = (file_hash(uploaded_file), chat_id) if uploaded_file is not None else None
+
+    if analyze_button:
+        if uploaded_file is not None:
+            with st.spinner("Идет анализ..."):
+                try:
+                    result = analyze_chat(backend_url, uploaded_file, chat_id)
+                    if not result["aggregates"]["rows_total"]:
+                        st.warning("В чате не найдено сообщений для анализа.")
+                        return
+                    save_result("chat_analysis", result_key, result)
                 except requests.exceptions.RequestException as e:
                     st.error(f"Ошибка при отправке файла: {e}")
+                except (RuntimeError, TimeoutError) as e:
+                    st.error(f"Ошибка анализа: {e}")
         else:
             st.error("Пожалуйста, загрузите HTML файл.")
 
-    # Если анализ прошёл успешно и df получен, выводим кнопку для скачивания CSV
-    if df is not None:
-        df_filtered = df.drop(columns=["datetime"], errors="ignore")
-        csv_buffer = io.StringIO()
-        df_filtered.to_csv(csv_buffer, index=False, encoding="utf-8")
-        csv_bytes = csv_buffer.getvalue().encode()
+    result = get_result("chat_analysis", result_key) if result_key is not None else None
+
+    # Если анализ прошёл успешно, выводим результаты и кнопку для скачивания CSV
+    if result is not None:
+        try:
+            show_chat_results(backend_url, result)
+        except requests.exceptions.RequestException as e:
+            st.error(f"Ошибка при загрузке сообщений: {e}")
+
         st.sidebar.header("Скачать размеченный DataFrame в формате CSV")
-        st.sidebar.download_button(
-            label="Скачать",
-            data=csv_bytes,
-            file_name="labeled_chat.csv",
-            mime="text/csv"
-        )
+        # Полная таблица скачивается с бэкенда только по запросу пользователя
+        if "csv" not in result and st.sidebar.button("Подготовить CSV"):
+            try:
+                result["csv"] = fetch_job_csv(backend_url, result["job_id"])
+            except requests.exceptions.RequestException as e:
+                st.sidebar.error(f"Ошибка при загрузке CSV: {e}")
+        if "csv" in result:
+            st.sidebar.download_button(
+                label="Скачать",
+                data=result["csv"],
+                file_name="labeled_chat.csv",
+                mime="text/csv"
+            )
@@ -0,0 +1,59 @@
+import time
+import requests
+import streamlit as st
+
+from utilities.api_client import get_session
+
+
+CHUNK_SIZE = 8 * 1024 * 1024
+MAX_RETRIES = 5
+
+
+def upload_file(backend_url, uploaded_file, chunk_size=CHUNK_SIZE):
+    # Загружает файл на бэкенд частями; после обрыва связи продолжает с подтверждённого сервером смещения
+    uploaded_file.seek(0, 2)
+    total_size = uploaded_file.tell()
+
+    response = get_session().post(
+        f"{backend_url}/uploads/",
+        json={"filename": uploaded_file.name, "total_size": total_size},
+        timeout=30
+    )
+    response.raise_for_status()
+    upload = response.json()
+    upload_id = upload["upload_id"]
+    offset = upload["offset"]
+
+    progress = st.progress(0.0, text="Загрузка файла...")
+    retries = 0
+    while offset < total_size:
+        uploaded_file.seek(offset)
+        chunk = uploaded_file.read(chunk_size)
+        try:
+            response = get_session().put(
+                f"{backend_url}/uploads/{upload_id}",
+                params={"offset": offset},
+                data=chunk,
+                headers={"Content-Type": "application/octet-stream"},
+                timeout=120
+            )
+            if response.status_code == 409:
+                # Сервер получил другую часть, чем мы думали: продолжаем с его смещения
+                offset = response.json()["detail"]["offset"]
+                continue
+            response.raise_for_status()
+            offset = response.json()["offset"]
+            retries = 0
+        except (requests.ConnectionError, requests.Timeout):
+            retries += 1
+            if retries > MAX_RETRIES:
+                progress.empty()
+                raise
+            # Повтор с тем же смещением: если часть всё же дошла, сервер ответит 409 с актуальным смещением
+            time.sleep(min(2 ** retries, 30))
+
+        progress.progress(offset / max(total_size, 1), text=f"Загружено {offset // 1024} из {total_size // 1024} КБ")
+
+    progress.empty()
+    uploaded_file.seek(0)
+    return upload_id
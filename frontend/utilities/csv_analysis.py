@@ -1,99 +1,139 @@
-import io
-import pandas as pd
 import streamlit as st
 import requests
 import plotly.express as px
 from wordcloud import WordCloud
 import matplotlib.pyplot as plt
 
+from utilities.api_client import get_session
+from utilities.analysis_jobs import BACKGROUND_JOB_MIN_SIZE, run_analysis_job
+from utilities.caching import file_hash, get_result, sniff_uploaded_csv, save_result
+from utilities.chunked_upload import upload_file
+from utilities.ndjson_stream import read_labeled_rows
+
+
+def analyze_csv(backend_url, uploaded_file, text_column, schema):
+    upload_id = upload_file(backend_url, uploaded_file)
+    # Разделитель и кодировка уже определены по началу файла, бэкенду не нужно определять их заново
+    data = {
+        "text_column": text_column,
+        "upload_id": upload_id,
+        "delimiter": schema["delimiter"],
+        "encoding": schema["encoding"],
+    }
+
+    if uploaded_file.size >= BACKGROUND_JOB_MIN_SIZE:
+        df_result, summary = run_analysis_job(backend_url, {**data, "kind": "csv"})
+    else:
+        response = get_session().post(f"{backend_url}/csv_analysis/", data=data, stream=True, timeout=(10, 600))
+        response.raise_for_status()
+        df_result, summary = read_labeled_rows(response, preview_columns=[text_column, "label", "score"])
+    if df_result.empty:
+        return df_result, {}
+
+    mapping = {
+        "LABEL_0": "Neutral",
+        "LABEL_1": "Positive",
+        "LABEL_2": "Negative"
+    }
+
+    df_result["label"] = df_result["label"].map(mapping).fillna(df_result["label"])
+    # Частоты токенов по меткам бэкенд считает во время инференса
+    word_frequencies = {
+        mapping.get(label, label): frequencies
+        for label, frequencies in summary.get("word_frequencies", {}).items()
+    }
+    return df_result, word_frequencies
+
+
+def show_csv_results(df_result, text_column, word_frequencies):
+    columns_to_display = [text_column, "label", "score"]
+    st.subheader("Полученный DataFrame")
+    st.dataframe(df_result[columns_to_display].tail())
+
+    st.subheader("Распределение предсказанных меток")
+    fig1 = px.histogram(df_result, x="label")
+    st.plotly_chart(fig1)
+
+    st.subheader("Облако слов для каждого класса")
+    # Облака строятся по готовым top-K частотам: время не зависит от размера датасета
+    unique_labels = sorted(df_result["label"].unique())
+    cols = st.columns(len(unique_labels))
+
+    for i, label in enumerate(unique_labels):
+        frequencies = word_frequencies.get(label, {})
+        with cols[i]:
+            st.write(f"{label}")
+            if frequencies:
+                wordcloud = WordCloud(
+                    width=300,
+                    height=200,
+                    background_color='white',
+                    colormap='Greens',
+                    max_font_size=50,
+                    random_state=42
+                ).generate_from_frequencies(frequencies)
+
+                fig, ax = plt.subplots(figsize=(3, 2))
+                ax.imshow(wordcloud, interpolation="bilinear")
+                ax.axis("off")
+                st.pyplot(fig)
+            else:
+                st.write("Нет текста для построения облака слов.")
+
 
 def csv_analysis(backend_url):
     st.sidebar.header("Настройки анализа CSV данных")
     uploaded_file = st.sidebar.file_uploader("Загрузите CSV файл", type="csv")
-    saved = False
 
+    text_column = None
+    schema = None
     if uploaded_file is not None:
-        file_contents = uploaded_file.getvalue().decode("utf-8")
-        df = pd.read_csv(io.StringIO(file_contents))
-        text_column = st.sidebar.selectbox("Выберите столбец для классификации", options=df.columns)
-    else:
-        text_column = None
+        schema = sniff_uploaded_csv(uploaded_file)
+        if schema["columns"]:
+            # По умолчанию выбран столбец, который больше всего похож на текст
+            default_column = (schema["text_columns"] or schema["columns"])[0]
+            text_column = st.sidebar.selectbox(
+                "Выберите столбец для классификации",
+                options=schema["columns"],
+                index=schema["columns"].index(default_column)
+            )
 
     analyze_button = st.sidebar.button("Анализировать данные")
 
+    # Результат привязан к содержимому файла и столбцу: при смене виджетов он берётся из сессии
+    result_key = (file_hash(uploaded_file), text_column) if uploaded_file is not None else None
+
     if analyze_button:
         if uploaded_file is not None and text_column is not None:
             with st.spinner("Идет анализ..."):
                 try:
-                    files = {
-                        "file": (uploaded_file.name, file_contents, "text/csv")
-                    }
-                    data = {"text_column": text_column}
-
-                    response = requests.post(f"{backend_url}/csv_analysis/", files=files, data=data)
-                    data = response.json()
-
-                    if isinstance(data, dict):
-                        data = [data]
-                    df_result = pd.DataFrame(data)
-
-                    mapping = {
-                        "LABEL_0": "Neutral",
-                        "LABEL_1": "Positive",
-                        "LABEL_2": "Negative"
-                    }
-
-                    df_result["label"] = df_result["label"].map(mapping).fillna(df_result["label"])
-
-                    columns_to_display = [text_column, "label", "score"]
-                    st.subheader("Полученный DataFrame")
-                    st.dataframe(df_result[columns_to_display].tail())
+                    df_result, word_frequencies = analyze_csv(backend_url, uploaded_file, text_column, schema)
+                    if df_result.empty:
+                        st.warning("После предобработки не осталось строк для анализа.")
+                        return
 
                     df_filtered = df_result.drop(columns=["clean_message"], errors="ignore")
-                    saved = True
-
-                    st.subheader("Распределение предсказанных меток")
-                    fig1 = px.histogram(df_result, x="label")
-                    st.plotly_chart(fig1)
-
-                    st.subheader("Облако слов для каждого класса")
-                    text_source = "clean_message" if "clean_message" in df_result.columns else text_column
-
-                    unique_labels = sorted(df_result["label"].unique())
-                    cols = st.columns(len(unique_labels))
-
-                    for i, label in enumerate(unique_labels):
-                        text = " ".join(df_result[df_result["label"] == label][text_source].astype(str))
-                        with cols[i]:
-                            st.write(f"{label}")
-                            if text.strip():
-                                wordcloud = WordCloud(
-                                    width=300,
-                                    height=200,
-                                    background_color='white',
-                                    colormap='Greens',
-                                    max_font_size=50,
-                                    random_state=42
-                                ).generate(text)
-
-                                fig, ax = plt.subplots(figsize=(3, 2))
-                                ax.imshow(wordcloud, interpolation="bilinear")
-                                ax.axis("off")
-                                st.pyplot(fig)
-                            else:
-                                st.write("Нет текста для построения облака слов.")
-
+                    csv_bytes = df_filtered.to_csv(index=False).encode("utf-8")
+                    save_result(
+                        "csv_analysis",
+                        result_key,
+                        {"df": df_result, "csv": csv_bytes, "word_frequencies": word_frequencies}
+                    )
                 except requests.exceptions.RequestException as e:
-                    saved = False
                     st.error(f"Ошибка при отправке файла: {e}")
+                except (RuntimeError, TimeoutError) as e:
+                    st.error(f"Ошибка анализа: {e}")
         else:
             st.error("Пожалуйста, загрузите CSV файл и выберите столбец.")
 
-    if saved:
+    result = get_result("csv_analysis", result_key) if result_key is not None else None
+
+    if result is not None:
+        show_csv_results(result["df"], text_column, result["word_frequencies"])
         st.sidebar.header("Скачать размеченный CSV")
         st.sidebar.download_button(
             label="Скачать размеченный CSV",
-            data=df_filtered.to_csv(index=False).encode("utf-8"),
+            data=result["csv"],
             file_name="analysis_data.csv",
             mime="text/csv"
-        )
\ No newline at end of file
+        )
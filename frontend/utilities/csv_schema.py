@@ -0,0 +1,124 @@
+import codecs
+import csv
+import io
+import pandas as pd
+
+
+# Для выбора столбца читается только начало файла, а не весь CSV
+SAMPLE_SIZE = 64 * 1024
+DELIMITERS = ",;\t|"
+# Столбец считается текстовым, если в среднем длиннее этого числа символов
+MIN_TEXT_LENGTH = 10
+
+
+def detect_encoding(sample):
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    # Если выборка не UTF-8, пробуем типичную для русских выгрузок из Excel cp1251
+    for encoding in ("utf-8", "cp1251"):
+        try:
+            # final=False: выборка может обрываться посреди многобайтового символа
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return "latin-1"
+
+
+def complete_lines(text):
+    # Последняя строка выборки может быть обрезана
+    end = text.rfind("\n")
+    return text[:end + 1] if end > 0 else text
+
+
+def detect_delimiter(text):
+    try:
+        return csv.Sniffer().sniff(text, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+
+def complete_records(text, delimiter):
+    # Выборка может оборваться внутри поля в кавычках с переводами строк (многострочные отзывы):
+    # оставляем только записи, которые csv.reader прочитал целиком, последняя отбрасывается
+    lines = list(io.StringIO(text, newline=""))
+    consumed = 0
+
+    def feed():
+        nonlocal consumed
+        for line in lines:
+            consumed += 1
+            yield line
+
+    ends = []
+    try:
+        for _ in csv.reader(feed(), delimiter=delimiter):
+            ends.append(consumed)
+    except csv.Error:
+        pass
+    if len(ends) < 2:
+        return text
+    return "".join(lines[:ends[-2]])
+
+
+def record_widths(text, delimiter):
+    try:
+        return {len(row) for row in csv.reader(io.StringIO(text, newline=""), delimiter=delimiter) if row}
+    except csv.Error:
+        return set()
+
+
+def trim_records(text, delimiter):
+    # Границы записей зависят от разделителя (кавычки учитываются только в начале поля), а Sniffer
+    # на выборке, оборванной внутри многострочного поля, ошибается. Разделитель подтверждается тем,
+    # что все полные записи имеют одинаковое число столбцов; первой проверяется исходная догадка
+    for candidate in dict.fromkeys(delimiter + DELIMITERS):
+        trimmed = complete_records(text, candidate)
+        widths = record_widths(trimmed, candidate)
+        if len(widths) == 1 and widths.pop() > 1:
+            return trimmed, candidate
+    return complete_records(text, delimiter), delimiter
+
+
+def read_header(text, delimiter):
+    try:
+        return next(csv.reader(io.StringIO(text, newline=""), delimiter=delimiter), [])
+    except csv.Error:
+        return []
+
+
+def detect_text_columns(sample_df):
+    # Текстовые столбцы - строковые с достаточно длинными значениями, самые длинные первыми
+    lengths = {}
+    for column in sample_df.columns:
+        values = sample_df[column].dropna()
+        if values.empty or not all(isinstance(value, str) for value in values):
+            continue
+        mean_length = values.str.len().mean()
+        if mean_length >= MIN_TEXT_LENGTH:
+            lengths[column] = mean_length
+    return sorted(lengths, key=lengths.get, reverse=True)
+
+
+def sniff_csv(sample):
+    encoding = detect_encoding(sample)
+    text = complete_lines(sample.decode(encoding, errors="ignore"))
+    delimiter = detect_delimiter(text)
+    if not text.strip():
+        return {"encoding": encoding, "delimiter": delimiter, "columns": [], "text_columns": []}
+    if len(sample) >= SAMPLE_SIZE:
+        # Обрезанная выборка: разделитель уточняется по полностью прочитанным записям
+        text, delimiter = trim_records(text, delimiter)
+    try:
+        sample_df = pd.read_csv(io.StringIO(text), sep=delimiter)
+    except (pd.errors.ParserError, csv.Error) as e:
+        # Выборку не удалось разобрать: столбцы берутся из заголовка, текстовые выбирает пользователь
+        print(f"Error in sniff_csv: {e}")
+        columns = read_header(text, delimiter)
+        return {"encoding": encoding, "delimiter": delimiter, "columns": columns, "text_columns": []}
+    return {
+        "encoding": encoding,
+        "delimiter": delimiter,
+        "columns": sample_df.columns.tolist(),
+        "text_columns": detect_text_columns(sample_df),
+    }
@@ -6,6 +6,9 @@ import altair as alt
 import matplotlib.pyplot as plt
 import plotly.express as px
 
+from utilities.api_client import get_session
+from utilities.caching import file_hash, get_result, sniff_uploaded_csv, save_result
+
 
 def data_preprocessing_ui(backend_url):
     st.sidebar.header("Настройки подготовки CSV")
@@ -13,29 +16,37 @@ def data_preprocessing_ui(backend_url):
 
     text_column = None  # Инициализируем переменную
     if uploaded_file is not None:
-        file_contents = uploaded_file.getvalue().decode("utf-8")
-        df = pd.read_csv(io.StringIO(file_contents))
-        text_column = st.sidebar.selectbox("Выберите столбец для очистки", options=df.columns)
+        schema = sniff_uploaded_csv(uploaded_file)
+        if schema["columns"]:
+            # По умолчанию выбран столбец, который больше всего похож на текст
+            default_column = (schema["text_columns"] or schema["columns"])[0]
+            text_column = st.sidebar.selectbox(
+                "Выберите столбец для очистки",
+                options=schema["columns"],
+                index=schema["columns"].index(default_column)
+            )
 
     preprocess_button = st.sidebar.button("Очистить CSV")
-    cleaned_csv_data = None  # Локальная переменная для хранения очищённых данных
+    # Очищенный CSV хранится в сессии: смена виджетов не отправляет файл на бэкенд повторно
+    result_key = (file_hash(uploaded_file), text_column) if uploaded_file is not None else None
 
     if preprocess_button:
-        if uploaded_file is not None:
+        if uploaded_file is not None and text_column is not None:
             files = {"file": uploaded_file}
-            data = {"text_column": text_column}
+            data = {"text_column": text_column, "delimiter": schema["delimiter"], "encoding": schema["encoding"]}
             with st.spinner("Очищаем данные..."):
                 try:
-                    response = requests.post(f"{backend_url}/preprocess_csv/", files=files, data=data)
+                    response = get_session().post(f"{backend_url}/preprocess_csv/", files=files, data=data)
                     response.raise_for_status()
-                    cleaned_csv_data = response.content
+                    save_result("data_preprocessing", result_key, response.content)
                     st.success("CSV файл успешно очищен!")
                 except requests.exceptions.RequestException as e:
                     st.error(f"Ошибка при отправке файла на бэкенд: {e}")
-                    cleaned_csv_data = None
         else:
             st.error("Пожалуйста, загрузите CSV файл.")
 
+    cleaned_csv_data = get_result("data_preprocessing", result_key) if result_key is not None else None
+
     if cleaned_csv_data:
         st.sidebar.header("Скачать очищенный CSV")
         st.sidebar.download_button(
@@ -49,12 +60,17 @@ def data_preprocessing_ui(backend_url):
     return cleaned_csv_data, text_column
 
 
+@st.cache_data(max_entries=4, show_spinner=False)
+def read_cleaned_csv(cleaned_csv_data):
+    return pd.read_csv(io.BytesIO(cleaned_csv_data))
+
+
 def analyze_csv_data(cleaned_csv_data, text_column):
     if not cleaned_csv_data or len(cleaned_csv_data) == 0:
         return
     try:
         # Чтение очищённого CSV-файла
-        df = pd.read_csv(io.BytesIO(cleaned_csv_data))
+        df = read_cleaned_csv(cleaned_csv_data).copy()
     except Exception as e:
         st.error(f"Ошибка чтения CSV: {e}")
         return
@@ -0,0 +1,42 @@
+import json
+import pandas as pd
+import streamlit as st
+
+
+def read_labeled_rows(response, preview_columns=None):
+    # Читает NDJSON-поток бэкенда и показывает результаты по мере готовности порций.
+    # Возвращает строки и итоговую сводку (частоты токенов по меткам)
+    progress = st.progress(0.0, text="Идет классификация...")
+    preview = st.empty()
+    rows = []
+    summary = {}
+
+    for line in response.iter_lines():
+        if not line:
+            continue
+        message = json.loads(line)
+
+        if message["type"] == "error":
+            progress.empty()
+            raise RuntimeError(message["detail"])
+
+        if message["type"] == "summary":
+            summary = message
+            continue
+
+        if message["type"] == "rows":
+            rows.extend(message["rows"])
+            rows_done, rows_total = message["rows_done"], message["rows_total"]
+            progress.progress(
+                min(rows_done / max(rows_total, 1), 1.0),
+                text=f"Обработано строк: {rows_done} из {rows_total}"
+            )
+
+            batch_df = pd.DataFrame(message["rows"])
+            if preview_columns:
+                batch_df = batch_df[[c for c in preview_columns if c in batch_df.columns]]
+            preview.dataframe(batch_df.tail())
+
+    progress.empty()
+    preview.empty()
+    return pd.DataFrame(rows), summary
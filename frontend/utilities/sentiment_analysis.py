@@ -3,6 +3,8 @@ import plotly.express as px
 import pandas as pd
 import requests
 
+from utilities.api_client import get_session
+
 def sentiment_analysis_ui(backend_url):
     st.sidebar.header("Настройки анализа тональности")
     input_text = st.sidebar.text_area(
@@ -19,13 +21,23 @@ def sentiment_analysis_ui(backend_url):
     def analyze_text_from_backend(text):
         api_url = f"{backend_url}/analyze_sentiment/" # Уточненный URL
         try:
-            response = requests.post(api_url, json={"text": text})
+            response = get_session().post(api_url, json={"text": text})
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             st.error(f"Ошибка при запросе к бэкенду: {e}")
             return None
 
+    def analyze_texts_from_backend(texts):
+        # Все тексты уходят одним запросом, результаты приходят в том же порядке
+        try:
+            response = get_session().post(f"{backend_url}/analyze_sentiment_batch/", json={"texts": texts})
+            response.raise_for_status()
+            return response.json()["results"]
+        except requests.exceptions.RequestException as e:
+            st.error(f"Ошибка при запросе к бэкенду: {e}")
+            return []
+
     if analyze_button:
         if not input_text.strip():
             st.error("Пожалуйста, введите текст для анализа.")
@@ -73,12 +85,9 @@ def sentiment_analysis_ui(backend_url):
             "Мне так грустно… Ожидания не оправдались, и я чувствую полное разочарование."
         ]
 
-        demo_results = []
         with st.spinner("Обрабатываем демо-тексты..."):
-            for text in sample_texts:
-                result = analyze_text_from_backend(text)
-                if result:
-                    demo_results.append({"text": text, **result})
+            results = analyze_texts_from_backend(sample_texts)
+            demo_results = [{"text": text, **result} for text, result in zip(sample_texts, results)]
 
         if demo_results:
             df_demo = pd.DataFrame(demo_results)
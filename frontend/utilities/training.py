@@ -2,6 +2,67 @@ import streamlit as st
 import requests
 import time
 
+from utilities.api_client import get_session
+
+
+STATUS_NAMES = {
+    "starting": "Запуск",
+    "running": "Обучение",
+    "cancelling": "Остановка",
+    "completed": "Завершено",
+    "failed": "Ошибка",
+    "cancelled": "Остановлено",
+}
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+def show_training_status(backend_url, job_id):
+    cancel_button = st.sidebar.button("Остановить обучение")
+    if cancel_button:
+        try:
+            get_session().post(f"{backend_url}/train_cancel/{job_id}").raise_for_status()
+        except requests.exceptions.RequestException as e:
+            st.error(f"Не удалось остановить обучение: {e}")
+
+    st.subheader("Ход обучения")
+    progress_bar = st.progress(0.0)
+    details = st.empty()
+
+    while True:
+        try:
+            response = get_session().get(f"{backend_url}/train_status/{job_id}")
+            response.raise_for_status()
+            status = response.json()
+        except requests.exceptions.RequestException as e:
+            st.error(f"Ошибка при получении статуса обучения: {e}")
+            return
+
+        progress_bar.progress(min(float(status.get("progress") or 0), 1.0))
+        with details.container():
+            st.write("**Статус:**", STATUS_NAMES.get(status["status"], status["status"]))
+            if status.get("max_steps"):
+                st.write("**Шаг:**", f"{status['step']} из {status['max_steps']}")
+            if status.get("epoch"):
+                st.write("**Эпоха:**", f"{status['epoch']:.2f}")
+            if status.get("loss") is not None:
+                st.write("**Loss:**", f"{status['loss']:.4f}")
+            if status.get("samples_per_second"):
+                st.write("**Скорость:**", f"{status['samples_per_second']:.2f} примеров/с")
+            if status.get("epoch_times"):
+                st.write("**Время эпох:**", ", ".join(f"{seconds:.1f} с" for seconds in status["epoch_times"]))
+
+        if status["status"] in TERMINAL_STATUSES:
+            if status["status"] == "completed":
+                st.success("Обучение завершено, модель обновлена!")
+            elif status["status"] == "failed":
+                st.error(f"Обучение завершилось с ошибкой: {status.get('error')}")
+            else:
+                st.warning("Обучение остановлено, модель не изменилась.")
+            st.session_state.pop("training_job_id", None)
+            return
+
+        time.sleep(2)
+
 
 def training(backend_url):
     st.sidebar.header("Настройки обучения")
@@ -13,10 +74,15 @@ def training(backend_url):
             files = {"file": uploaded_file}
             with st.spinner("Запуск обучения..."):
                 try:
-                    response = requests.post(f"{backend_url}/train/", files=files)
+                    response = get_session().post(f"{backend_url}/train/", files=files)
                     response.raise_for_status()
+                    st.session_state["training_job_id"] = response.json()["job_id"]
 
                 except requests.exceptions.RequestException as e:
                     st.error(f"Ошибка при отправке файла на бэкенд: {e}")
         else:
-            st.error("Пожалуйста, загрузите CSV файл.")
\ No newline at end of file
+            st.error("Пожалуйста, загрузите CSV файл.")
+
+    job_id = st.session_state.get("training_job_id")
+    if job_id:
+        show_training_status(backend_url, job_id)